@@ -0,0 +1,65 @@
+"""Compare whole-document hi_res partitioning with the production path (per-page strategies, worker pool).
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pdf_partition path/to/document.pdf [--repeat 1]
+"""
+import argparse
+import time
+from collections import Counter
+from src.utils.pdf_partition import (
+    PDF_PARTITION_WORKERS,
+    count_pdf_pages,
+    partition_pdf_chunks,
+    partition_pdf_serial,
+)
+
+def summarize_chunks(chunks) -> dict:
+    pages = [getattr(chunk.metadata, "page_number", None) for chunk in chunks]
+    return {
+        "chunks": len(chunks),
+        "types": dict(Counter(type(chunk).__name__ for chunk in chunks)),
+        "pages": sorted({page for page in pages if page is not None}),
+        "characters": sum(len(getattr(chunk, "text", "") or "") for chunk in chunks),
+    }
+
+def time_run(label: str, fn, file_content: bytes, repeat: int):
+    timings = []
+    chunks = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = fn(file_content)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{label:<10} best {best:8.2f}s  runs {[round(t, 2) for t in timings]}")
+    return best, chunks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.pdf, "rb") as f:
+        file_content = f.read()
+
+    page_count = count_pdf_pages(file_content)
+    print(f"{args.pdf}: {page_count} pages, {PDF_PARTITION_WORKERS} workers")
+
+    # First call also pays for spawning workers and loading their layout models
+    print("Warming up worker pool...")
+    partition_pdf_chunks(file_content)
+
+    serial_time, serial_chunks = time_run("serial", partition_pdf_serial, file_content, args.repeat)
+    parallel_time, parallel_chunks = time_run(
+        "production", lambda content: partition_pdf_chunks(content)[0], file_content, args.repeat
+    )
+
+    serial_summary = summarize_chunks(serial_chunks)
+    parallel_summary = summarize_chunks(parallel_chunks)
+    print(f"speedup    {serial_time / parallel_time:8.2f}x")
+    print(f"serial     {serial_summary['chunks']} chunks {serial_summary['types']} {serial_summary['characters']} chars")
+    print(f"production {parallel_summary['chunks']} chunks {parallel_summary['types']} {parallel_summary['characters']} chars")
+    print(f"page numbers match: {serial_summary['pages'] == parallel_summary['pages']}")
+
+if __name__ == "__main__":
+    main()
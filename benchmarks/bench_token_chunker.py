@@ -0,0 +1,79 @@
+"""Compare the per-word chunker with the encode-once splitter in src.utils.tokenizer.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_token_chunker [path/to/text.txt] [--max-tokens 1500] [--repeat 3]
+
+Without a file, a synthetic document of roughly 50 pages is used.
+"""
+import argparse
+import random
+import time
+from src.utils.tokenizer import ENCODER, split_on_tokens
+
+WORDS = (
+    "revenue growth quarter analysis table figure customer retention forecast model "
+    "significant increase decrease compared previous year results indicate strategy "
+    "2023 3.5% $1,200 Q4 EBITDA north-east region multi-channel well-known"
+).split()
+
+def legacy_chunk_text(text: str, max_tokens: int) -> list:
+    """The per-word implementation the summarizers and question.py used before."""
+    words = text.split()
+    chunks, chunk = [], []
+    tokens = 0
+
+    for word in words:
+        word_tokens = len(ENCODER.encode(word + " "))
+        if tokens + word_tokens > max_tokens:
+            if chunk:
+                chunks.append(" ".join(chunk))
+                chunk, tokens = [], 0
+        chunk.append(word)
+        tokens += word_tokens
+
+    if chunk:
+        chunks.append(" ".join(chunk))
+    return chunks
+
+def synthetic_document(pages: int = 50, words_per_page: int = 500) -> str:
+    rng = random.Random(0)
+    paragraphs = []
+    for _ in range(pages * 5):
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(words_per_page // 5)))
+    return "\n\n".join(paragraphs)
+
+def time_run(label: str, fn, repeat: int):
+    timings = []
+    chunks = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = fn()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    sizes = [len(ENCODER.encode(chunk)) for chunk in chunks]
+    print(
+        f"{label:<8} best {best * 1000:9.1f}ms  chunks {len(chunks):4d}  "
+        f"tokens/chunk max {max(sizes)} mean {sum(sizes) / len(sizes):.0f}"
+    )
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--max-tokens", type=int, default=1500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.path:
+        with open(args.path, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_document()
+    print(f"{len(text)} characters, {len(text.split())} words, {len(ENCODER.encode(text))} tokens")
+
+    legacy_time = time_run("legacy", lambda: legacy_chunk_text(text, args.max_tokens), args.repeat)
+    new_time = time_run("offsets", lambda: split_on_tokens(text, args.max_tokens), args.repeat)
+    print(f"speedup  {legacy_time / new_time:9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare visuaLens backends on latency and on agreement with the transformers baseline.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_visualens_backends image1.png [image2.jpg ...] [--backends transformers int8] [--threads 4]
+
+Each image is captioned with BLIP and the caption summarized with BART on every backend.
+Agreement is ROUGE-L F1 of each backend's caption and summary against the transformers output.
+"""
+import argparse
+import os
+import time
+
+def rouge_l(reference: str, candidate: str) -> float:
+    """ROUGE-L F1 over lowercase word tokens."""
+    ref, cand = reference.lower().split(), candidate.lower().split()
+    if not ref or not cand:
+        return 0.0
+    previous = [0] * (len(cand) + 1)
+    for ref_word in ref:
+        current = [0]
+        for j, cand_word in enumerate(cand):
+            current.append(previous[j] + 1 if ref_word == cand_word else max(previous[j + 1], current[j]))
+        previous = current
+    lcs = previous[-1]
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(cand), lcs / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+def run_backend(backend: str, images: list) -> dict:
+    from PIL import Image
+    from src.utils.visuaLens import BLIP_MODEL_NAME, SUMMARIZER_MODEL_NAME
+    from src.utils.visualens_backends import load_blip, load_summarizer, runtime_of
+
+    start = time.perf_counter()
+    processor, model = load_blip(BLIP_MODEL_NAME, backend)
+    summarizer = load_summarizer(SUMMARIZER_MODEL_NAME, backend)
+    load_seconds = time.perf_counter() - start
+
+    captions, summaries, caption_times, summary_times = [], [], [], []
+    for path in images:
+        image = Image.open(path).convert("RGB")
+        start = time.perf_counter()
+        inputs = processor(images=image, return_tensors="pt")
+        caption = processor.decode(model.generate(**inputs)[0], skip_special_tokens=True)
+        caption_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        summary = summarizer(caption, min_length=80, max_length=500, do_sample=False)[0]["summary_text"]
+        summary_times.append(time.perf_counter() - start)
+        captions.append(caption)
+        summaries.append(summary)
+
+    return {
+        "load_seconds": load_seconds,
+        "runtimes": f"{runtime_of((processor, model))}/{runtime_of(summarizer)}",
+        "captions": captions,
+        "summaries": summaries,
+        "caption_seconds": sum(caption_times) / len(caption_times),
+        "summary_seconds": sum(summary_times) / len(summary_times),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--backends", nargs="+", default=["transformers", "int8"])
+    parser.add_argument("--threads", type=int, default=0, help="Sets VISUALENS_NUM_THREADS for every backend")
+    args = parser.parse_args()
+
+    if args.threads:
+        os.environ["VISUALENS_NUM_THREADS"] = str(args.threads)
+    backends = args.backends if "transformers" in args.backends else ["transformers"] + args.backends
+
+    results = {}
+    for backend in backends:
+        print(f"Running {backend}...")
+        results[backend] = run_backend(backend, args.images)
+
+    baseline = results["transformers"]
+    print(f"\n{'backend':<14}{'load s':>8}{'caption s':>11}{'summary s':>11}{'caption RL':>12}{'summary RL':>12}  runtimes (blip/bart)")
+    for backend, result in results.items():
+        caption_agreement = sum(map(rouge_l, baseline["captions"], result["captions"])) / len(args.images)
+        summary_agreement = sum(map(rouge_l, baseline["summaries"], result["summaries"])) / len(args.images)
+        print(
+            f"{backend:<14}{result['load_seconds']:>8.1f}{result['caption_seconds']:>11.2f}"
+            f"{result['summary_seconds']:>11.2f}{caption_agreement:>12.3f}{summary_agreement:>12.3f}  {result['runtimes']}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -4,34 +4,54 @@ import matplotlib.pyplot as plt
 plt.ioff() 
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Optional
 import uuid
 import io
+import json
 from dotenv import load_dotenv
-from unstructured.partition.pdf import partition_pdf
-from src.utils.briefDoc_summarizer import summarize_all
-from src.utils.ytvideo_summarizer import process_video
-from src.utils.detailDoc_summarizer import summarize_all_in_detail
+from src.utils.pdf_partition import partition_pdf_chunks
+from src.utils.briefDoc_summarizer import asummarize_all
+from src.utils.ytvideo_summarizer import aprocess_video, SUMMARY_ERROR
+from src.utils.ytvideo_transcripter import extract_video_id
+from src.utils.detailDoc_summarizer import asummarize_all_in_detail
 from unstructured.partition.docx import partition_docx
-from src.utils.visuaLens import extract_and_summarize_image
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.storage import InMemoryStore
+from src.utils.visuaLens import analyze_images, extract_and_summarize_image, warmup_visualens
+from src.utils.model_registry import model_registry
+from src.utils.image_summarizer import caption_images, caption_images_for_index
+from src.utils.session_store import SessionStore, collection_name_of
+from src.utils.answer_cache import AnswerCache
+from src.utils.session_index import build_multi_vector_retriever, build_vectorstore, collection_name_for, prune_session_indexes_periodically, read_session_meta, session_build_lock
+from src.utils.ingest_cache import (
+    file_digest, get_cached_extraction, cache_extraction, get_cached_result, cache_result,
+    get_cached_index, cache_index, get_cached_image_analysis, cache_image_analysis, ingest_cache_stats
+)
+from src.utils.summary_cache import summary_cache_stats
+from src.utils.transcript_cache import transcript_cache_stats
+from src.utils.tokenizer import tokenizer_stats
+from src.utils.image_preprocess import image_preprocess_stats
+from src.utils.jobs import JobManager
+from src.utils.rate_limiter import rate_limiter
+from src.utils.embeddings import get_embedding_model, warmup_in_background, is_embedding_ready, embedding_warmup_error, embedding_stats
 from langchain.schema.document import Document
-from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from src.utils.question import answer_question_legacy
+from src.utils.question import aanswer_question_legacy, astream_answer_question_legacy
 from google.oauth2 import id_token
 from google.auth.transport import requests
 import os
 from dotenv import load_dotenv
 import re
+import threading
+import time
 
 load_dotenv()
 
 app = FastAPI()
 
+VISUALENS_WARMUP = os.getenv("VISUALENS_WARMUP", "false").lower() == "true"
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -40,6 +60,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_embedding_warmup():
+    # Warm the shared embedding model in the background; /health and /vectorize report readiness
+    warmup_in_background()
+    # Expired sessions are swept off disk here, never inside a request
+    threading.Thread(target=prune_session_indexes_periodically, name="session-prune", daemon=True).start()
+    # visuaLens models otherwise load on the first visuaLens request
+    if VISUALENS_WARMUP:
+        threading.Thread(target=warmup_visualens, name="visualens-warmup", daemon=True).start()
+
+@app.get("/health")
+def health():
+    return {
+        "status": "degraded" if embedding_warmup_error() else "ok",
+        "embeddings_ready": is_embedding_ready(),
+        "embeddings_error": embedding_warmup_error(),
+        "embeddings": embedding_stats(),
+        "sessions": session_store.stats(),
+        "answer_cache": answer_cache.stats(),
+        "ingest_cache": ingest_cache_stats(),
+        "summary_cache": summary_cache_stats(),
+        "transcript_cache": transcript_cache_stats(),
+        "tokenizer": tokenizer_stats(),
+        "images": image_preprocess_stats(),
+        "models": model_registry.stats(),
+        "jobs": job_manager.stats(),
+        "rate_limits": rate_limiter.utilisation()
+    }
+
 SECRET_KEY = os.getenv("NEXTAUTH_SECRET")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 
@@ -128,24 +177,18 @@ def auto_detect_and_verify(token: str):
         print(f"Auto-detection failed: {str(e)}")
         raise HTTPException(status_code=403, detail="Token verification failed")
 
-retrievers_store = {}
+# Retrievers keyed by session_id (documents, images) or video_id (sumTube)
+session_store = SessionStore()
+answer_cache = AnswerCache()
+
+# Background ingestion jobs started through /vectorize/jobs
+job_manager = JobManager()
 
 def extract_pdf_content_from_bytes(file_content: bytes, filename: str):
     """Extract text, images, and tables from PDF bytes using unstructured.partition.pdf"""
     try:
-        file_obj = io.BytesIO(file_content)
-        
-        chunks = partition_pdf(
-            file=file_obj,
-            infer_table_structure=True,
-            strategy="hi_res",
-            extract_image_block_types=["Image"],
-            extract_image_block_to_payload=True,
-            chunking_strategy="by_title",
-            max_characters=10000,
-            combine_text_under_n_chars=2000,
-            new_after_n_chars=6000,
-        )
+        # by_title chunking over pages partitioned with fast or hi_res; long PDFs fan out across worker processes
+        chunks, partition_stats = partition_pdf_chunks(file_content)
         
         tables, texts, images_b64 = [], [], []
 
@@ -170,7 +213,8 @@ def extract_pdf_content_from_bytes(file_content: bytes, filename: str):
         return {
             "texts": texts,
             "tables": tables,
-            "images": images_b64
+            "images": images_b64,
+            "partition_stats": partition_stats
         }
     except Exception as e:
         print(f"Error processing PDF: {e}")
@@ -221,29 +265,25 @@ def extract_docx_content_from_bytes(file_content: bytes, filename: str):
         raise HTTPException(status_code=500, detail=f"DOCX processing failed: {str(e)}")
 
 
-def vectorize_content(texts, tables, images, collection_name=None): 
-    """Vectorize content (texts, tables, images) and return retriever with metadata."""
+def vectorize_content(texts, tables, images, session_id=None, digest=None): 
+    """Vectorize content (texts, tables, images) and return retriever with metadata.
+
+    With the ``digest`` of an uploaded file, the image captions and vectors are cached, and a
+    later upload of the same file is indexed from them without vision or embedding calls.
+    """
     try:
         print("Starting vectorization...")
 
-        # Initialize embedding model
-        embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        
-        if not collection_name:
-            collection_name = f"multi_modal_rag_{uuid.uuid4().hex[:8]}"
-        
-        # Create vector store and doc store
-        vectorstore = Chroma(collection_name=collection_name, embedding_function=embedding_model)
-        store = InMemoryStore()
-        id_key = "doc_id"
-
-        retriever = MultiVectorRetriever(
-            vectorstore=vectorstore,
-            docstore=store,
-            id_key=id_key,
-        )
+        if not session_id:
+            session_id = str(uuid.uuid4())
+        collection_name = collection_name_for(session_id)
+
+        # Vector store and doc store for this session, persisted when SESSION_PERSIST_DIR is set
+        retriever = build_multi_vector_retriever(session_id)
+        id_key = retriever.id_key
 
         doc_ids, all_docs, original_content = [], [], []
+        stored_docs = []  # What the docstore returns for each doc_id
 
         # Vectorize Text Chunks
         for text_chunk in texts:
@@ -254,7 +294,9 @@ def vectorize_content(texts, tables, images, collection_name=None):
                 "type": "text",
                 "page_number": getattr(text_chunk.metadata, 'page_number', None) if hasattr(text_chunk, 'metadata') else None
             }
-            all_docs.append(Document(page_content=content, metadata=metadata))
+            doc = Document(page_content=content, metadata=metadata)
+            all_docs.append(doc)
+            stored_docs.append(doc)
             doc_ids.append(doc_id)
             original_content.append(content)
 
@@ -271,16 +313,20 @@ def vectorize_content(texts, tables, images, collection_name=None):
                 "type": "table",
                 "page_number": getattr(table_chunk.metadata, 'page_number', None) if hasattr(table_chunk, 'metadata') else None
             }
-            all_docs.append(Document(page_content=content, metadata=metadata))
+            doc = Document(page_content=content, metadata=metadata)
+            all_docs.append(doc)
+            stored_docs.append(doc)
             doc_ids.append(doc_id)
             original_content.append(content)
 
-        # Vectorize Images
-        for i, img_b64 in enumerate(images):
-            doc_id = str(uuid.uuid4())
+        cached_index = get_cached_index(digest) if digest else None
+        if cached_index is not None and len(cached_index["captions"]) != len(images):
+            cached_index = None
 
-            # Send only raw base64 string to the backend
-            content = img_b64.strip()  # clean base64 string, no URL prefix
+        # Vectorize Images: embed a short caption, keep the raw base64 only in the docstore
+        captions = cached_index["captions"] if cached_index else caption_images_for_index(images)
+        for i, (img_b64, caption) in enumerate(zip(images, captions)):
+            doc_id = str(uuid.uuid4())
 
             metadata = {
                 id_key: doc_id,
@@ -288,15 +334,32 @@ def vectorize_content(texts, tables, images, collection_name=None):
                 "image_index": i
             }
 
-            all_docs.append(Document(page_content=content, metadata=metadata))
+            all_docs.append(Document(page_content=caption, metadata=metadata))
+            # Clean base64 string, no URL prefix
+            stored_docs.append(Document(page_content=img_b64.strip(), metadata={**metadata, "summary": caption}))
             doc_ids.append(doc_id)
             original_content.append(img_b64)
 
 
         # Store in retriever
         if all_docs:
-            retriever.vectorstore.add_documents(all_docs)
-            retriever.docstore.mset(list(zip(doc_ids, all_docs)))
+            contents = [doc.page_content for doc in all_docs]
+            if cached_index is not None and len(cached_index["vectors"]) == len(all_docs):
+                print("Reusing cached captions and vectors of this file")
+                vectors = cached_index["vectors"]
+            else:
+                cached_index = None
+                vectors = get_embedding_model().embed_documents(contents)
+            # Vectors are computed here rather than by Chroma so they can be cached with the file
+            retriever.vectorstore._collection.upsert(
+                ids=doc_ids,
+                embeddings=vectors,
+                metadatas=[doc.metadata for doc in all_docs],
+                documents=contents
+            )
+            retriever.docstore.mset(list(zip(doc_ids, stored_docs)))
+            if digest and cached_index is None:
+                cache_index(digest, captions, vectors)
 
         print(f"Vectorization completed: {len(all_docs)} documents")
 
@@ -312,194 +375,467 @@ def vectorize_content(texts, tables, images, collection_name=None):
         print(f"Vectorization error: {e}")
         raise HTTPException(status_code=500, detail=f"Vectorization failed: {str(e)}")
 
-def vectorize_text(summary: str, persist_directory: str = None):
+def vectorize_text(summary: str, video_id: str):
+    """Index a video summary in its own collection, persisted and reused for that video_id."""
     # 1. Split summary into chunks
     splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=50)
     docs = [Document(page_content=chunk) for chunk in splitter.split_text(summary)]
-    
-    # 2. Use HuggingFace Embeddings
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    # 3. Create Chroma index
-    vectorstore = Chroma.from_documents(
-        documents=docs,
-        embedding=embeddings,
-        persist_directory=persist_directory  # Optional: provide a directory to persist
-    )
-    
-    # 4. Return as retriever for consistency
-    return vectorstore.as_retriever(search_kwargs={"k": 5})
 
-@app.post("/vectorize")
-async def vectorize(
-    mode: str = Form(...),
-    file: Optional[UploadFile] = File(None),
-    url: Optional[str] = Form(None),
-    user: dict = Depends(verify_token) 
-):
+    # 2. Fill a fresh per-video collection and swap it in; users querying the old one keep working
+    search_kwargs = {"k": 5}
+    vectorstore = build_vectorstore(video_id, search_kwargs, docs, source_digest=file_digest(summary.encode("utf-8")))
+
+    # 3. Return as retriever for consistency
+    return vectorstore.as_retriever(search_kwargs=search_kwargs)
+
+def ensure_video_index(video_id: str, summary: str, replace: bool = False, requested_at: Optional[float] = None):
+    """Retriever for a video's summary index, built once per video across requests and workers.
+
+    The build runs under a per-video lock, so concurrent submissions of a popular video wait for
+    one build instead of racing. With ``replace`` the index is rebuilt for a new summary, unless,
+    once the lock is held, the session on disk turns out to be built from the same summary or by
+    another submission that finished after this one was ``requested_at``.
+    """
+    with session_build_lock(video_id):
+        meta = read_session_meta(video_id)
+        if replace and meta is not None and (
+            meta.get("source_digest") == file_digest(summary.encode("utf-8"))
+            or (requested_at is not None and meta["created_at"] >= requested_at)
+        ):
+            replace = False
+        retriever = None if replace else session_store.get(video_id)
+        if retriever is None:
+            retriever = vectorize_text(summary, video_id)
+            session_store.put(video_id, retriever)
+            # Answers about an earlier index of this video no longer apply
+            answer_cache.invalidate(video_id)
+        return retriever
+
+VALID_MODES = ["briefDoc", "sumTube", "detailDoc", "visuaLens"]
+DOCUMENT_CONTENT_TYPES = ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
+IMAGE_CONTENT_TYPES = ["image/png", "image/jpeg", "image/svg+xml"]
+VISUALENS_BATCH_MAX_IMAGES = int(os.getenv("VISUALENS_BATCH_MAX_IMAGES", "50"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))  # Per uploaded file, batches included
+
+def validate_vectorize_request(mode: str, file: Optional[UploadFile], url: Optional[str]):
+    """Reject bad /vectorize input before any work is started."""
+    if mode not in VALID_MODES:
+        raise HTTPException(status_code=400, detail="Invalid mode specified")
+
+    if mode in ["briefDoc", "detailDoc"]:
+        if not file:
+            raise HTTPException(status_code=400, detail="File is required for this mode")
+        if file.content_type not in DOCUMENT_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
+
+    elif mode == "visuaLens":
+        if not file:
+            raise HTTPException(status_code=400, detail="Image file is required for visuaLens mode")
+        if file.content_type not in IMAGE_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail="Only PNG, JPEG, and SVG files are supported")
+
+    elif mode == "sumTube" and not url:
+        raise HTTPException(status_code=400, detail="URL is required for sumTube mode")
+
+async def read_upload(file: UploadFile) -> bytes:
+    """Read an uploaded file, rejecting it with 413 once it exceeds MAX_UPLOAD_BYTES."""
+    content = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(content) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"{file.filename}: files are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+    return content
+
+def ensure_embeddings_ready():
+    if not is_embedding_ready():
+        # A failed startup warmup is retried here instead of leaving the worker stuck on 503
+        warmup_in_background()
+        raise HTTPException(
+            status_code=503,
+            detail="Embedding model is warming up. Please retry shortly.",
+            headers={"Retry-After": "5"}
+        )
+
+async def run_ingestion(
+    mode: str,
+    file_content: Optional[bytes] = None,
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    url: Optional[str] = None,
+    report=None
+) -> dict:
+    """Ingest one upload or video and return the /vectorize response.
+
+    Blocking stages (partitioning, embedding, model calls) run in the threadpool so the event
+    loop stays free. ``report(stage, progress)`` is called as the ingestion moves between stages.
+    """
+    report = report or (lambda stage, progress: None)
     extracted_content = None
     extracted_Image_Content = None
     retriever = None
+    digest = None
+    cached = None
+    result = None
+
+    if mode in ["briefDoc", "detailDoc"]:
+        # Same bytes and mode as an earlier upload: reuse its extraction and summaries, but index
+        # into a new session so uploads never share a session or its answer cache
+        # Hashing and unpickling multi-MB cache entries would otherwise hold up the event loop
+        digest = await run_in_threadpool(file_digest, file_content)
+        cached = await run_in_threadpool(get_cached_result, digest, mode)
+
+        extracted_content = await run_in_threadpool(get_cached_extraction, digest)
+        if extracted_content is None:
+            report("partitioning", 0.05)
+            print(f"Extracting content from {content_type} file.........")
+
+            if content_type == "application/pdf":
+                extracted_content = await run_in_threadpool(extract_pdf_content_from_bytes, file_content, filename)
+            else:
+                extracted_content = await run_in_threadpool(extract_docx_content_from_bytes, file_content, filename)
+            await run_in_threadpool(cache_extraction, digest, extracted_content)
+        else:
+            print("Reusing cached partition output for this file")
+
+    elif mode == "visuaLens":
+        # An image analyzed before, alone or in a batch, is indexed into a new session without analyzing it again
+        image_digest = await run_in_threadpool(file_digest, file_content)
+        result = await run_in_threadpool(get_cached_image_analysis, image_digest)
+        if result is None:
+            report("analyzing", 0.05)
+            print(f"Processing image content for visuaLens.........")
 
-    try:
-        if mode not in ["briefDoc", "sumTube", "detailDoc", "visuaLens"]:
-            raise HTTPException(status_code=400, detail="Invalid mode specified")
-
-        if mode in ["briefDoc", "detailDoc"]:
-            if not file:
-                raise HTTPException(status_code=400, detail="File is required for this mode")
+            # Directly summarize image
+            result = await run_in_threadpool(extract_and_summarize_image, file_content)
+            await run_in_threadpool(cache_image_analysis, image_digest, result)
+        # Extract both summary and raw text from the result
+        summary_text = result.get("summary") or result.get("caption") or ""
+        raw_text = result.get("raw_text") or ""
+
+        # Combine them into a single string for vectorization
+        summary_for_vector = f"{raw_text}\n\n{summary_text}"
+
+        extracted_Image_Content = {
+            "texts": [summary_for_vector],
+            "tables": [],
+            "images": []  
+        }
 
-            if file.content_type not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                raise HTTPException(status_code=400, detail="Only PDF and DOCX files are supported")
+    elif mode == "sumTube":
+        video_id = extract_video_id(url)
+        cached = await run_in_threadpool(get_cached_result, video_id, mode) if video_id else None
+        if cached:
+            # The summary is reused as is; its index is only rebuilt when it was evicted
+            print("Reusing earlier sumTube ingestion of this video")
+            report("embedding", 0.8)
+            await run_in_threadpool(ensure_video_index, video_id, cached['result']['summary'])
+            return {
+                "success": True,
+                "mode": mode,
+                "session_id": video_id,
+                "vectorized_metadata": None,
+                "result": cached['result'],
+                "cached": True
+            }
 
-            file_content = await file.read()
-            print(f"Extracting content from {file.content_type} file.........")
+        report("transcribing", 0.05)
+        requested_at = time.time()
+        result = await aprocess_video(url)
+        if result is None:
+            raise HTTPException(status_code=400, detail="Failed to process video URL")
 
-            if file.content_type == "application/pdf":
-                extracted_content = extract_pdf_content_from_bytes(file_content, file.filename)
-            else:
-                extracted_content = extract_docx_content_from_bytes(file_content, file.filename)  # Make sure you define this function
+        print(f"Video processing result: {result}")
 
-        elif mode == "visuaLens":
-            if not file:
-                raise HTTPException(status_code=400, detail="Image file is required for visuaLens mode")
+        # Vectorize summary for future QA - NOW RETURNS A RETRIEVER
+        report("embedding", 0.8)
+        # Each video has its own collection, so evicting it releases only that video's index
+        # Error summaries come out identical each time, so a failing video is not re-indexed on every submission
+        await run_in_threadpool(ensure_video_index, result['video_id'], result['summary'], True, requested_at)
+        if result['summary'] != SUMMARY_ERROR:
+            # The next user who submits this video reuses the summary and the index
+            await run_in_threadpool(cache_result, result['video_id'], mode, result)
 
-            if file.content_type not in ["image/png", "image/jpeg", "image/svg+xml"]:
-                raise HTTPException(status_code=400, detail="Only PNG, JPEG, and SVG files are supported")
+        return {
+            "success": True,
+            "mode": mode,
+            "session_id": result['video_id'],
+            "vectorized_metadata": None,
+            "result": result
+        }
 
-            file_content = await file.read()
-            print(f"Processing image content for visuaLens.........")
-            
-            # Directly summarize image
-            result = extract_and_summarize_image(file_content)
-            # Extract both summary and raw text from the result
-            summary_text = result.get("summary") or result.get("caption") or ""
-            raw_text = result.get("raw_text") or ""
-
-            # Combine them into a single string for vectorization
-            summary_for_vector = f"{raw_text}\n\n{summary_text}"
-
-            extracted_Image_Content = {
-                "texts": [summary_for_vector],
-                "tables": [],
-                "images": []  
-            }
+    # Vectorization (only for file modes)
+    vectorized_metadata = None
+    session_id = str(uuid.uuid4())  # Generate unique session ID
+    content_to_index = extracted_content or extracted_Image_Content
+
+    if content_to_index:
+        report("embedding", 0.4)
+        # Run in the threadpool so concurrent uploads and queries share embedding batches
+        retriever, vectorized_metadata = await run_in_threadpool(
+            vectorize_content,
+            content_to_index['texts'],
+            content_to_index['tables'],
+            content_to_index['images'],
+            session_id,
+            digest
+        )
+        # Store retriever for future queries; sizing a session may scan its collection
+        await run_in_threadpool(session_store.put, session_id, retriever)
+        answer_cache.invalidate(session_id)
+        if content_to_index.get('partition_stats'):
+            vectorized_metadata["partition"] = content_to_index['partition_stats']
+
+    if mode in ["briefDoc", "detailDoc"] and cached:
+        print(f"Reusing cached {mode} summaries of this file")
+        result = cached['result']
+
+    # Get top-k relevant chunks for summarization
+    elif mode in ["briefDoc", "detailDoc"] and retriever:
+        report("summarizing", 0.6)
+        combined_filter = {"type": {"$in": ["image", "text", "table"]}}
+        retriever.search_kwargs = {"k": 10, "filter": combined_filter}
+        summary_query = "main points key information important details"
+        top_k_docs = await run_in_threadpool(retriever.get_relevant_documents, summary_query)
+
+        top_texts = []
+        top_tables = []
+        top_images = []
+
+        for doc in top_k_docs:
+            doc_type = getattr(doc.metadata, "get", lambda k, d=None: "text")("type", "text")
+            page_content = getattr(doc, "page_content", str(doc))
+
+            if doc_type == "text":
+                top_texts.append(page_content)
+            elif doc_type == "table":
+                top_tables.append(page_content)
+            elif doc_type == "image":
+                doc_id = doc.metadata.get("doc_id") if hasattr(doc, 'metadata') else None
+                stored_doc = retriever.docstore.mget([doc_id])[0] if doc_id and hasattr(retriever, 'docstore') else None
+                if stored_doc is not None:
+                    top_images.append(stored_doc.page_content)
+
+        # The images were captioned while indexing; their cached captions stand in as image summaries
+        images = top_images if top_images else extracted_content['images']
+        image_summaries = await run_in_threadpool(caption_images, images)
+
+        # LLM calls are awaited directly, so waiting on Groq or the rate limiter holds no thread
+        summarize = asummarize_all if mode == "briefDoc" else asummarize_all_in_detail
+        result = await summarize(
+            texts=top_texts if top_texts else extracted_content['texts'],
+            tables=top_tables if top_tables else extracted_content['tables'],
+            images=images,
+            image_summaries=image_summaries
+        )
+        print(f"{'Brief' if mode == 'briefDoc' else 'Detail'} summary result: {result}")
 
+    if digest and retriever and not cached:
+        await run_in_threadpool(cache_result, digest, mode, result)
 
-        elif mode == "sumTube":
-            if not url:
-                raise HTTPException(status_code=400, detail="URL is required for sumTube mode")
-            
-            result = process_video(url)
-            if result is None:
-                raise HTTPException(status_code=400, detail="Failed to process video URL")
+    return {
+        "success": True,
+        "mode": mode,
+        "session_id": session_id if content_to_index else None,
+        "vectorized_metadata": vectorized_metadata,
+        "result": result
+    }
 
-            print(f"Video processing result: {result}")
+@app.post("/vectorize")
+async def vectorize(
+    mode: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    url: Optional[str] = Form(None),
+    user: dict = Depends(verify_token) 
+):
+    ensure_embeddings_ready()
 
-            # Vectorize summary for future QA - NOW RETURNS A RETRIEVER
-            vectorstore_retriever = vectorize_text(result['summary'])
-            print(vectorstore_retriever)
-            retrievers_store[result['video_id']] = vectorstore_retriever
+    try:
+        validate_vectorize_request(mode, file, url)
+        file_content = await read_upload(file) if file and mode != "sumTube" else None
+
+        return await run_ingestion(
+            mode,
+            file_content=file_content,
+            content_type=file.content_type if file else None,
+            filename=file.filename if file else None,
+            url=url
+        )
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Unexpected error: {e}")
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
 
-        # Vectorization (only for PDF file modes)
-        vectorized_metadata = None
-        session_id = str(uuid.uuid4())  # Generate unique session ID
-        
-        if extracted_content:
-            retriever, vectorized_metadata = vectorize_content(
-                extracted_content['texts'],
-                extracted_content['tables'],
-                extracted_content['images']
-            )
-            # Store retriever for future queries
-            retrievers_store[session_id] = retriever
-        
-        elif extracted_Image_Content:
-            retriever, vectorized_metadata = vectorize_content(
-                extracted_Image_Content['texts'],
-                extracted_Image_Content['tables'],
-                extracted_Image_Content['images']
-            )
-            retrievers_store[session_id] = retriever
-            
-        # Get top-k relevant chunks for summarization
-        if mode in ["briefDoc", "detailDoc"] and retriever:
-            combined_filter = {"type": {"$in": ["image", "text", "table"]}}
-            retriever.search_kwargs = {"k": 10, "filter": combined_filter}
-            summary_query = "main points key information important details"
-            top_k_docs = retriever.get_relevant_documents(summary_query)
-
-            top_texts = []
-            top_tables = []
-            top_images = []
-
-            for doc in top_k_docs:
-                doc_type = getattr(doc.metadata, "get", lambda k, d=None: "text")("type", "text")
-                page_content = getattr(doc, "page_content", str(doc))
-
-                if doc_type == "text":
-                    top_texts.append(page_content)
-                elif doc_type == "table":
-                    top_tables.append(page_content)
-                elif doc_type == "image":
-                    doc_id = doc.metadata.get("doc_id") if hasattr(doc, 'metadata') else None
-                    if doc_id and hasattr(retriever, 'docstore') and doc_id in retriever.docstore.store:
-                        top_images.append(retriever.docstore.store[doc_id].page_content)
-                    else:
-                        top_images.append("image_placeholder")
-
-            if mode == "briefDoc":
-                result = summarize_all(
-                    texts=top_texts if top_texts else extracted_content['texts'],
-                    tables=top_tables if top_tables else extracted_content['tables'],
-                    images=top_images if top_images else extracted_content['images']
-                )
-                print(f"Brief summary result: {result}")
-
-            elif mode == "detailDoc":
-                result = summarize_all_in_detail(
-                    texts=top_texts if top_texts else extracted_content['texts'],
-                    tables=top_tables if top_tables else extracted_content['tables'],
-                    images=top_images if top_images else extracted_content['images']
-                )
-                print(f"Detail summary result: {result}")
-
-            elif mode == "sumTube":
-                result = process_video(url)
-                print(f"Video summary result: {result}")
-            else:
-                raise HTTPException(status_code=400, detail="Invalid mode specified")
+def validate_image_batch(files: Optional[List[UploadFile]]):
+    """Reject a bad visuaLens batch before any image is read."""
+    if not files:
+        raise HTTPException(status_code=400, detail="At least one image file is required")
+    if len(files) > VISUALENS_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {VISUALENS_BATCH_MAX_IMAGES} images per batch")
+    for file in files:
+        if file.content_type not in IMAGE_CONTENT_TYPES:
+            raise HTTPException(status_code=400, detail=f"{file.filename}: only PNG, JPEG, and SVG files are supported")
+
+async def run_image_batch(filenames: List[str], contents: List[bytes], report=None) -> dict:
+    """Analyze a batch of images and index them together under one session; the batch response."""
+    report = report or (lambda stage, progress: None)
+    digests = [file_digest(content) for content in contents]
+
+    # Images analyzed before, alone or in another batch, are not analyzed again
+    results = await run_in_threadpool(lambda: [get_cached_image_analysis(digest) for digest in digests])
+    pending = [i for i, result in enumerate(results) if result is None]
+    if pending:
+        report("analyzing", 0.05)
+        analyzed = await run_in_threadpool(analyze_images, [contents[i] for i in pending])
+        for i, result in zip(pending, analyzed):
+            results[i] = result
+        await run_in_threadpool(lambda: [
+            cache_image_analysis(digests[i], results[i]) for i in pending if "error" not in results[i]
+        ])
+
+    texts = []
+    for filename, result in zip(filenames, results):
+        if "error" in result:
+            continue
+        summary_text = result.get("summary") or result.get("caption") or ""
+        raw_text = result.get("raw_text") or ""
+        texts.append(f"Image: {filename}\n\n{raw_text}\n\n{summary_text}")
+    if not texts:
+        raise HTTPException(status_code=500, detail="Image analysis failed for every image")
+
+    report("embedding", 0.8)
+    session_id = str(uuid.uuid4())
+    retriever, vectorized_metadata = await run_in_threadpool(vectorize_content, texts, [], [], session_id)
+    await run_in_threadpool(session_store.put, session_id, retriever)
+    answer_cache.invalidate(session_id)
+
+    return {
+        "success": True,
+        "mode": "visuaLens",
+        "session_id": session_id,
+        "vectorized_metadata": vectorized_metadata,
+        "results": [
+            {"filename": filename, **result}
+            for filename, result in zip(filenames, results)
+        ],
+        "analyzed": len(pending),
+        "cached": len(contents) - len(pending)
+    }
+
+@app.post("/vectorize/visuaLens/batch")
+async def vectorize_image_batch(
+    files: List[UploadFile] = File(...),
+    user: dict = Depends(verify_token)
+):
+    """Analyze many images in one request and index them together under a single session.
 
+    Large batches are better submitted to /vectorize/jobs with mode=visuaLens and several files.
+    """
+    ensure_embeddings_ready()
+    validate_image_batch(files)
 
-        if(mode == "sumTube"):
-            return {
-                "success": True,
-                "mode": mode,
-                "session_id": result['video_id'],
-                "vectorized_metadata": vectorized_metadata,
-                "result": result
-            }
-        elif(mode == "visuaLens"):
-            return {
-                "success": True,
-                "mode": mode,
-                "session_id": session_id if extracted_Image_Content else None,
-                "vectorized_metadata": vectorized_metadata,
-                "result": result
-            }
-        else:
-            return {
-                "success": True,
-                "mode": mode,
-                "session_id": session_id if extracted_content else None,
-                "vectorized_metadata": vectorized_metadata,
-                "result": result
-            }
+    try:
+        contents = [await read_upload(file) for file in files]
+        return await run_image_batch([file.filename for file in files], contents)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+        print(f"visuaLens batch error: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch image analysis failed: {str(e)}")
+
+def job_owner(user: dict) -> str:
+    """Owner key for jobs: the token's user id, else its email. Tokens with neither cannot own jobs."""
+    identity = user.get("user_id") or user.get("email")
+    if not identity:
+        raise HTTPException(status_code=403, detail="Token does not identify a user")
+    return f"{user.get('provider', 'unknown')}:{identity}"
+
+@app.post("/vectorize/jobs")
+async def submit_vectorize_job(
+    mode: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
+    url: Optional[str] = Form(None),
+    user: dict = Depends(verify_token)
+):
+    """Start ingestion in the background and return a job id to poll at /jobs/{job_id}.
+
+    mode=visuaLens with ``files`` runs a visuaLens batch, as /vectorize/visuaLens/batch does.
+    """
+    ensure_embeddings_ready()
+    if mode == "visuaLens" and files:
+        validate_image_batch(files)
+        filenames = [image.filename for image in files]
+        contents = [await read_upload(image) for image in files]
+
+        async def batch_work(report):
+            return await run_image_batch(filenames, contents, report)
+
+        job = job_manager.submit("visuaLens-batch", job_owner(user), batch_work)
+        return {
+            "success": True,
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/jobs/{job.id}"
+        }
+
+    validate_vectorize_request(mode, file, url)
+    file_content = await read_upload(file) if file and mode != "sumTube" else None
+    content_type = file.content_type if file else None
+    filename = file.filename if file else None
+
+    async def work(report):
+        return await run_ingestion(mode, file_content, content_type, filename, url, report)
+
+    job = job_manager.submit(mode, job_owner(user), work)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}"
+    }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(verify_token)):
+    owner = job_owner(user)
+    job = job_manager.get(job_id)
+    # Jobs without an owner are never handed out, whoever asks
+    if job is None or job.get("owner") is None or job.get("owner") != owner:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def search_by_vector(retriever, query_vector: list, k: int) -> list:
+    """Top ``k`` documents for an already embedded question, mirroring the retriever's own search."""
+    if hasattr(retriever, 'docstore'):
+        # Multi-vector retriever: search the summaries, return their parent documents in rank order
+        sub_docs = retriever.vectorstore.similarity_search_by_vector(query_vector, k=k)
+        ids = []
+        for doc in sub_docs:
+            doc_id = doc.metadata.get(retriever.id_key)
+            if doc_id and doc_id not in ids:
+                ids.append(doc_id)
+        return [doc for doc in retriever.docstore.mget(ids) if doc is not None]
+    # Plain vector store retriever (sumTube): the search lives on the wrapped vector store
+    return retriever.vectorstore.similarity_search_by_vector(query_vector, k=k)
+
+async def retrieve_for_question(key: Optional[str], question: str, k: int, query_vector: Optional[list] = None) -> list:
+    """Look up the session's retriever and fetch the top ``k`` documents for the question."""
+    # A miss reopens the session from disk
+    retriever = await run_in_threadpool(session_store.get, key)
+
+    if retriever is None:
+        if session_store.is_expired(key):
+            raise HTTPException(status_code=410, detail="Session expired. Please upload the document again.")
+        raise HTTPException(status_code=404, detail="Session or Video ID not found. Please upload a document first.")
+
+    if query_vector is not None:
+        return await run_in_threadpool(search_by_vector, retriever, query_vector, k)
+
+    # Retrieval embeds the question; run it off the event loop so concurrent queries batch together
+    if hasattr(retriever, 'search_kwargs'):
+        retriever.search_kwargs = {"k": k}
+        return await run_in_threadpool(retriever.get_relevant_documents, question)
+    return await run_in_threadpool(retriever.similarity_search, question, k=k)
 
 @app.post("/query")
 async def query_document(
@@ -512,17 +848,16 @@ async def query_document(
 
     try:
         key = session_id if session_id else video_id
-        
-        if not key or key not in retrievers_store:
-            raise HTTPException(status_code=404, detail="Session or Video ID not found. Please upload a document first.")
-        
-        retriever = retrievers_store.get(key)
-        
-        if hasattr(retriever, 'search_kwargs'):
-            retriever.search_kwargs = {"k": k}
-            relevant_docs = retriever.get_relevant_documents(question)
-        else:
-            relevant_docs = retriever.similarity_search(question, k=k)
+        # Embedded once: the same vector finds near-duplicate questions and drives retrieval
+        query_vector = await run_in_threadpool(get_embedding_model().embed_query, question)
+        # Answers are only reused for the index generation this worker now serves the session from
+        retriever = await run_in_threadpool(session_store.get, key)
+        generation = collection_name_of(retriever)
+        cached = answer_cache.lookup(key, query_vector, k, generation) if retriever is not None else None
+        if cached is not None:
+            return {"success": True, "question": question, "cached": True, **cached}
+
+        relevant_docs = await retrieve_for_question(key, question, k, query_vector)
         
         if not relevant_docs:
             return {
@@ -532,7 +867,14 @@ async def query_document(
                 "sources": []
             }
     
-        answer = answer_question_legacy(question, relevant_docs)
+        answer = await aanswer_question_legacy(question, relevant_docs)
+        # Failed answers come back without sources and are not worth repeating
+        if answer['sources']:
+            answer_cache.store(key, question, query_vector, k, {
+                "answer": answer['answer'],
+                "sources": answer['sources'],
+                "total_sources": answer['total_sources']
+            }, generation)
 
         return {
             "success": True,
@@ -547,3 +889,62 @@ async def query_document(
     except Exception as e:
         print(f"Query error: {e}")
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def query_document_stream(
+    session_id: Optional[str] = Form(None),
+    video_id: Optional[str] = Form(None),
+    question: str = Form(...),
+    k: int = Form(5),
+    user: dict = Depends(verify_token)
+):
+    """Same as /query, streamed as Server-Sent Events: `sources`, then `token` events, then `usage` and `done`."""
+    # Lookup errors (404/410) are raised before the stream starts, so they keep their status codes
+    try:
+        key = session_id if session_id else video_id
+        query_vector = await run_in_threadpool(get_embedding_model().embed_query, question)
+        retriever = await run_in_threadpool(session_store.get, key)
+        generation = collection_name_of(retriever)
+        cached = answer_cache.lookup(key, query_vector, k, generation) if retriever is not None else None
+        relevant_docs = None
+        if cached is None:
+            relevant_docs = await retrieve_for_question(key, question, k, query_vector)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Query error: {e}")
+        raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
+
+    async def events():
+        if cached is not None:
+            yield sse_event("sources", {"sources": cached['sources'], "total_sources": cached['total_sources']})
+            yield sse_event("token", cached['answer'])
+            yield sse_event("usage", {"cached": True, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated": False})
+        elif not relevant_docs:
+            yield sse_event("sources", {"sources": [], "total_sources": 0})
+            yield sse_event("token", "No relevant information found in the document.")
+        else:
+            try:
+                sources, tokens = None, []
+                async for event, data in astream_answer_question_legacy(question, relevant_docs):
+                    if event == "sources":
+                        sources = data
+                    elif event == "token":
+                        tokens.append(data)
+                    elif event == "usage" and sources and sources['sources']:
+                        answer_cache.store(key, question, query_vector, k, {"answer": "".join(tokens), **sources}, generation)
+                    yield sse_event(event, data)
+            except Exception as e:
+                print(f"Query stream error: {e}")
+                yield sse_event("error", {"detail": f"Query processing failed: {str(e)}"})
+        yield sse_event("done", {"question": question})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))  # Cosine similarity for a near-duplicate question
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_SESSIONS = int(os.getenv("ANSWER_CACHE_MAX_SESSIONS", "500"))
+ANSWER_CACHE_MAX_PER_SESSION = int(os.getenv("ANSWER_CACHE_MAX_PER_SESSION", "200"))
+
+class CachedAnswer:
+    def __init__(self, question: str, vector: np.ndarray, k: int, result: dict, generation: Optional[str] = None):
+        self.question = question
+        self.vector = vector
+        self.k = k
+        self.generation = generation
+        self.result = result
+        self.created_at = time.monotonic()
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class AnswerCache:
+    """Answers keyed by session or video id and question embedding.
+
+    A question whose embedding is within ``similarity`` (cosine) of a cached question for the same
+    session and ``k`` gets the cached answer and sources back without an LLM call. Sessions are
+    kept in least-recently-used order and each holds at most ``max_per_session`` answers, oldest
+    dropped first; answers older than ``ttl_seconds`` are never returned. Re-ingesting a session
+    must call ``invalidate`` so answers about the old documents are dropped.
+
+    Each answer also records the ``generation`` of the index it came from (its collection name).
+    The cache is per process while sessions are shared, so a session rebuilt by another worker is
+    only noticed here through the generation: answers about an earlier one are never returned.
+    """
+
+    def __init__(
+        self,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+        max_sessions: int = ANSWER_CACHE_MAX_SESSIONS,
+        max_per_session: int = ANSWER_CACHE_MAX_PER_SESSION,
+    ):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_per_session = max_per_session
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._invalidations = 0
+        self._evictions = {"ttl": 0, "entries": 0, "sessions": 0}
+
+    def lookup(self, key: Optional[str], vector: List[float], k: int, generation: Optional[str] = None) -> Optional[dict]:
+        """Cached result for the closest earlier question, or None when nothing is similar enough."""
+        if not key:
+            return None
+        query = _normalize(vector)
+        now = time.monotonic()
+
+        with self._lock:
+            answers = self._sessions.get(key)
+            best, best_score = None, self.similarity
+            if answers:
+                self._sessions.move_to_end(key)
+                # Answers are in insertion order, so expired ones are at the front
+                while answers and now - answers[0].created_at >= self.ttl_seconds:
+                    answers.pop(0)
+                    self._evictions["ttl"] += 1
+                candidates = [answer for answer in answers if answer.k == k and answer.generation == generation]
+                if candidates:
+                    scores = np.stack([answer.vector for answer in candidates]) @ query
+                    index = int(np.argmax(scores))
+                    if scores[index] >= best_score:
+                        best, best_score = candidates[index], float(scores[index])
+
+            if best is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+
+        print(f"Answer cache hit for session {key} (similarity {best_score:.3f} to '{best.question}')")
+        return dict(best.result)
+
+    def store(self, key: Optional[str], question: str, vector: List[float], k: int, result: dict, generation: Optional[str] = None) -> None:
+        if not key:
+            return
+        with self._lock:
+            answers = self._sessions.setdefault(key, [])
+            self._sessions.move_to_end(key)
+            answers.append(CachedAnswer(question, _normalize(vector), k, dict(result), generation))
+            self._stores += 1
+            while len(answers) > self.max_per_session:
+                answers.pop(0)
+                self._evictions["entries"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions["sessions"] += 1
+
+    def invalidate(self, key: Optional[str]) -> None:
+        """Forget every answer for ``key``, e.g. because its documents were replaced."""
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "sessions": len(self._sessions),
+                "answers": sum(len(answers) for answers in self._sessions.values()),
+                "similarity_threshold": self.similarity,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "stores": self._stores,
+                "invalidations": self._invalidations,
+                "evictions": dict(self._evictions),
+            }
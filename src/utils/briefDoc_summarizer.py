@@ -1,11 +1,14 @@
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
 import os
-import time
-import tiktoken
+import asyncio
+from typing import Optional
+from src.utils.rate_limiter import rate_limiter, is_rate_limit_error
+from src.utils.tokenizer import count_tokens, split_on_tokens
+from src.utils.summary_cache import lookup_summaries, store_summaries
+from src.utils.image_summarizer import summarize_images, asummarize_images
 
 load_dotenv()
 
@@ -14,83 +17,123 @@ if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in environment variables")
 
 MAX_TOKENS_PER_CHUNK = 1500  # To stay below Groq's TPM
-ENCODER = tiktoken.encoding_for_model("gpt-4")  # Close enough for token count approximation
-
-def estimate_tokens(text: str) -> int:
-    return len(ENCODER.encode(text))
+SUMMARY_MODEL_NAME = "llama3-70b-8192"
+SUMMARY_TEMPERATURE = 0.5
+PROMPT_TOKENS = 250  # Prompt template wrapped around each element
+RESPONSE_TOKENS = 400  # Expected summary length, reserved up front with the rate limiter
+IMAGE_SUMMARY_PROMPT = "Provide a brief summary describing what is shown in the image."
 
 def chunk_text(text: str, max_tokens: int = MAX_TOKENS_PER_CHUNK) -> list:
-    words = text.split()
-    chunks, chunk = [], []
-    tokens = 0
-
-    for word in words:
-        word_tokens = estimate_tokens(word + " ")
-        if tokens + word_tokens > max_tokens:
-            chunks.append(" ".join(chunk))
-            chunk, tokens = [], 0
-        chunk.append(word)
-        tokens += word_tokens
-
-    if chunk:
-        chunks.append(" ".join(chunk))
-    return chunks
+    return split_on_tokens(text, max_tokens)
 
 def preprocess_elements(elements, is_table=False):
     processed = []
     for el in elements:
         content = getattr(el, 'text_as_html', getattr(el, 'text', str(el))) if is_table else str(el)
-        if estimate_tokens(content) > MAX_TOKENS_PER_CHUNK:
+        if count_tokens(content) > MAX_TOKENS_PER_CHUNK:
             processed.extend(chunk_text(content))
         else:
             processed.append(content)
     return processed
 
-def summarize_elements(elements, summarize_chain, is_table=False):
+def summarize_elements(elements, summarize_chain, is_table=False, model_name=SUMMARY_MODEL_NAME):
     if not elements:
         return []
 
     # Preprocess elements to handle token limits and chunking
     elements = preprocess_elements(elements, is_table)
 
+    # Only chunks without a cached summary go to the LLM
+    keys, cached = lookup_summaries(elements, SUMMARY_PROMPT_TEMPLATE, model_name, SUMMARY_TEMPERATURE)
+    misses = [index for index, summary in enumerate(cached) if summary is None]
+    print(f"Summary cache: {len(elements) - len(misses)} of {len(elements)} chunks cached")
+    elements = [elements[index] for index in misses]
+    miss_keys = [keys[index] for index in misses]
+
     summaries = []
     chunk_size = 2
     i = 0
-    backoff = 10
 
     while i < len(elements):
         chunk = elements[i:i + chunk_size]
+        # Wait for budget here rather than sending into a 429
+        estimated_tokens = sum(count_tokens(el) + PROMPT_TOKENS + RESPONSE_TOKENS for el in chunk)
+        rate_limiter.reserve(model_name, estimated_tokens, requests=len(chunk))
         try:
             result = summarize_chain.batch(chunk, {"max_concurrency": 3})
             summaries += result
+            store_summaries(miss_keys[i:i + chunk_size], result)
             i += chunk_size
-            backoff = 10  # reset backoff on success
         except Exception as e:
             error_msg = str(e)
             print(f"Error summarizing elements: {error_msg}")
 
-            # Handle rate limiting with exponential backoff
-            if "rate_limit_exceeded" in error_msg or "Rate limit reached" in error_msg:
-                print(f"Rate limit hit. Waiting for {backoff}s before retrying...")
-                time.sleep(backoff)
-                backoff = min(backoff * 2, 60)  # Cap at 60 seconds
+            if is_rate_limit_error(e):
+                # Drain the shared budget so the retry (and every other caller) waits for it to refill
+                print("Rate limit hit. Retrying once the rate limiter has budget again...")
+                rate_limiter.penalize(model_name)
             else:
                 # For other errors, skip this chunk and continue
                 print(f"Skipping chunk due to error: {error_msg}")
                 i += chunk_size
                 break
     
-    return summaries
+    # Put the new summaries back between the cached ones, in document order
+    for index, summary in zip(misses, summaries):
+        cached[index] = summary
+    return [summary for summary in cached if summary is not None]
 
-def summarize_all(texts: list, tables: list, images: list) -> dict:
-    summary_model = ChatGroq(
-        temperature=0.5,
-        model_name="llama3-70b-8192",
-        api_key=GROQ_API_KEY
-    )
+async def asummarize_elements(elements, summarize_chain, is_table=False, model_name=SUMMARY_MODEL_NAME):
+    """Async variant of summarize_elements built on abatch; waits for rate limit budget without blocking."""
+    if not elements:
+        return []
+
+    # Chunking, token counting and cache reads are CPU and disk work; only the LLM calls stay on the event loop
+    elements = await asyncio.to_thread(preprocess_elements, elements, is_table)
+
+    # Only chunks without a cached summary go to the LLM
+    keys, cached = await asyncio.to_thread(lookup_summaries, elements, SUMMARY_PROMPT_TEMPLATE, model_name, SUMMARY_TEMPERATURE)
+    misses = [index for index, summary in enumerate(cached) if summary is None]
+    print(f"Summary cache: {len(elements) - len(misses)} of {len(elements)} chunks cached")
+    elements = [elements[index] for index in misses]
+    miss_keys = [keys[index] for index in misses]
+    chunk_tokens = await asyncio.to_thread(lambda: [count_tokens(el) for el in elements])
+
+    summaries = []
+    chunk_size = 2
+    i = 0
+
+    while i < len(elements):
+        chunk = elements[i:i + chunk_size]
+        # Wait for budget here rather than sending into a 429
+        estimated_tokens = sum(chunk_tokens[i:i + chunk_size]) + (PROMPT_TOKENS + RESPONSE_TOKENS) * len(chunk)
+        await rate_limiter.areserve(model_name, estimated_tokens, requests=len(chunk))
+        try:
+            result = await summarize_chain.abatch(chunk, {"max_concurrency": 3})
+            summaries += result
+            await asyncio.to_thread(store_summaries, miss_keys[i:i + chunk_size], result)
+            i += chunk_size
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Error summarizing elements: {error_msg}")
+
+            if is_rate_limit_error(e):
+                # Drain the shared budget so the retry (and every other caller) waits for it to refill
+                print("Rate limit hit. Retrying once the rate limiter has budget again...")
+                rate_limiter.penalize(model_name)
+            else:
+                # For other errors, skip this chunk and continue
+                print(f"Skipping chunk due to error: {error_msg}")
+                i += chunk_size
+                break
     
-    # Prompt modified to request a brief and concise summary only
-    summary_prompt = ChatPromptTemplate.from_template("""
+    # Put the new summaries back between the cached ones, in document order
+    for index, summary in zip(misses, summaries):
+        cached[index] = summary
+    return [summary for summary in cached if summary is not None]
+
+# Prompt modified to request a brief and concise summary only
+SUMMARY_PROMPT_TEMPLATE = """
 You are a concise summarization assistant.
 
 Summarize the following text or table using clear bullet points.
@@ -107,32 +150,53 @@ Input:
 {element}
 
 Summary:
-""")
+"""
 
+def build_summarize_chain():
+    summary_model = ChatGroq(
+        temperature=SUMMARY_TEMPERATURE,
+        model_name=SUMMARY_MODEL_NAME,
+        api_key=GROQ_API_KEY
+    )
     
-    summarize_chain = {"element": lambda x: x} | summary_prompt | summary_model | StrOutputParser()
+    summary_prompt = ChatPromptTemplate.from_template(SUMMARY_PROMPT_TEMPLATE)
+
+    return {"element": lambda x: x} | summary_prompt | summary_model | StrOutputParser()
+
+def summarize_all(texts: list, tables: list, images: list) -> dict:
+    summarize_chain = build_summarize_chain()
     
     text_summaries = summarize_elements(texts, summarize_chain, is_table=False)
     table_summaries = summarize_elements(tables, summarize_chain, is_table=True)
     
-    image_summaries = []
-    if images:
-        try:
-            groq_chat = ChatGroq(model_name="meta-llama/llama-4-maverick-17b-128e-instruct", api_key=GROQ_API_KEY)
-            
-            for image_b64 in images:
-                message = HumanMessage(content=[
-                    {"type": "text", "text": "Provide a brief summary describing what is shown in the image."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"}}
-                ])
-                response = groq_chat.invoke([message])
-                image_summaries.append(response.content)
-                
-        except Exception as e:
-            print(f"Error summarizing images: {e}")
+    # Images that fail every retry are left out; repeated images are listed once
+    image_summaries = list(dict.fromkeys(summary for summary in summarize_images(images, IMAGE_SUMMARY_PROMPT) if summary))
+    
+    return {
+        "text_summaries": text_summaries,
+        "table_summaries": table_summaries,
+        "image_summaries": image_summaries,
+    }
+
+async def asummarize_all(texts: list, tables: list, images: list, image_summaries: Optional[list] = None) -> dict:
+    summarize_chain = build_summarize_chain()
+
+    # Captions written while indexing come in as image_summaries; the images are not sent to the vision model again
+    async def summarize_images_once():
+        if image_summaries is not None:
+            return image_summaries
+        return await asummarize_images(images, IMAGE_SUMMARY_PROMPT)
+    
+    # Texts, tables and images share the rate limiter, so they can be summarized side by side
+    text_summaries, table_summaries, image_results = await asyncio.gather(
+        asummarize_elements(texts, summarize_chain, is_table=False),
+        asummarize_elements(tables, summarize_chain, is_table=True),
+        summarize_images_once()
+    )
+    image_summaries = list(dict.fromkeys(summary for summary in image_results if summary))
     
     return {
         "text_summaries": text_summaries,
         "table_summaries": table_summaries,
         "image_summaries": image_summaries,
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+class DiskCache:
+    """Pickle-per-key cache on local disk, bounded by total size with least-recently-used eviction.
+
+    Keys are hashed into file names, writes are atomic, and a read refreshes the file's mtime so
+    eviction removes the entries nobody has read for the longest time. With ``ttl_seconds`` the
+    mtime is the write time instead: reads leave it alone, so an entry expires that long after it
+    was written however often it is read, and eviction drops the oldest writes first. Several
+    workers can share one directory; each keeps its own hit/miss counters.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, ttl_seconds: Optional[float] = None, name: str = "cache"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._lock = threading.Lock()
+        self._bytes = None  # Lazily computed from a directory scan
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            if self.ttl_seconds is not None and time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            if self.ttl_seconds is None:
+                os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            return default
+        except Exception as e:
+            print(f"{self.name}: dropping unreadable entry {key}: {e}")
+            self._remove(path)
+            with self._lock:
+                self._misses += 1
+            return default
+
+        with self._lock:
+            self._hits += 1
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"{self.name}: value for {key} is not cacheable: {e}")
+            return
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"{self.name}: failed to write {key}: {e}")
+            self._remove(tmp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            if self._bytes is not None:
+                self._bytes += len(data) - old_size
+        self._evict_if_needed()
+
+    def delete(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def _remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= size
+
+    def _scan(self) -> list:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict_if_needed(self) -> None:
+        with self._lock:
+            if self._bytes is not None and self._bytes <= self.max_bytes:
+                return
+
+        # Rescan so entries written by other workers are counted too
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._bytes = total
+            self._evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,170 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBED_MAX_BATCH_SIZE = int(os.getenv("EMBED_MAX_BATCH_SIZE", "64"))  # Texts per forward pass
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "10"))  # How long a batch waits for more texts
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that merges texts from concurrent callers into shared forward passes.
+
+    Each caller's texts are queued together with a future. A single worker thread drains the
+    queue into batches of up to ``max_batch_size`` texts, waiting at most ``max_wait_ms`` for a
+    batch to fill, embeds the batch in one call and hands each caller back its own slice.
+    """
+
+    def __init__(self, model: Embeddings, max_batch_size: int = EMBED_MAX_BATCH_SIZE, max_wait_ms: float = EMBED_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._carry = None  # Request that did not fit into the previous batch
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._texts = 0
+        self._requests = 0
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def _submit(self, texts: List[str]) -> Future:
+        future = Future()
+        self._queue.put((texts, future))
+        return future
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        with self._stats_lock:
+            self._requests += 1
+        # Split large requests so a big upload cannot starve small queries behind it
+        futures = [
+            self._submit(texts[i:i + self.max_batch_size])
+            for i in range(0, len(texts), self.max_batch_size)
+        ]
+        vectors = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _collect_batch(self) -> list:
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+        pending = [first]
+        size = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                self._carry = item
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect_batch()
+            batch = [text for texts, _ in pending for text in texts]
+            try:
+                vectors = self.model.embed_documents(batch)
+            except Exception as e:
+                print(f"Embedding batch of {len(batch)} texts failed: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self._batches += 1
+                self._texts += len(batch)
+
+            offset = 0
+            for texts, future in pending:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "texts": self._texts,
+                "avg_batch_size": round(self._texts / self._batches, 2) if self._batches else 0.0,
+                "queued": self._queue.qsize(),
+            }
+
+_embedding_model = None
+_embedding_lock = threading.Lock()
+_embedding_ready = threading.Event()
+_warmup_lock = threading.Lock()
+_warmup_error = None  # Message from the last failed warmup, cleared once one succeeds
+
+def get_embedding_model() -> BatchedEmbeddings:
+    """Return the process-wide embedding model, loading it on first use."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                start = time.perf_counter()
+                model = HuggingFaceEmbeddings(
+                    model_name=EMBEDDING_MODEL_NAME,
+                    encode_kwargs={"batch_size": EMBED_MAX_BATCH_SIZE}
+                )
+                _embedding_model = BatchedEmbeddings(model)
+                print(f"Loaded embedding model {EMBEDDING_MODEL_NAME} in {time.perf_counter() - start:.2f}s")
+    return _embedding_model
+
+def warmup_embeddings() -> None:
+    """Load the embedding model and run one forward pass so the first request is not served cold.
+
+    A failure is recorded rather than raised; the next warmup_in_background() call tries again.
+    """
+    global _warmup_error
+    if _embedding_ready.is_set() or not _warmup_lock.acquire(blocking=False):
+        return
+    try:
+        model = get_embedding_model()
+        start = time.perf_counter()
+        model.embed_query("warmup")
+        _warmup_error = None
+        _embedding_ready.set()
+        print(f"Embedding model warmed up in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        _warmup_error = str(e)
+        print(f"Embedding warmup failed, retrying on the next request: {e}")
+    finally:
+        _warmup_lock.release()
+
+def warmup_in_background() -> None:
+    """Start a warmup thread unless the model is ready or a warmup is already running."""
+    if not _embedding_ready.is_set() and not _warmup_lock.locked():
+        threading.Thread(target=warmup_embeddings, name="embedding-warmup", daemon=True).start()
+
+def is_embedding_ready() -> bool:
+    """Whether the embedding model has been loaded and warmed up."""
+    return _embedding_ready.is_set()
+
+def embedding_warmup_error() -> Optional[str]:
+    """Why the last warmup failed, or None."""
+    return _warmup_error
+
+def embedding_stats() -> dict:
+    """Batching counters for the shared embedding model."""
+    if _embedding_model is None:
+        return {}
+    return _embedding_model.stats()
@@ -0,0 +1,113 @@
+import base64
+import io
+import os
+import threading
+from typing import List, Optional, Tuple
+from PIL import Image, ImageOps
+
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1024"))  # Longest side sent to the vision model
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_DEDUP_MAX_DISTANCE = int(os.getenv("IMAGE_DEDUP_MAX_DISTANCE", "4"))  # Differing dHash bits still counted as the same image
+DHASH_SIZE = 8  # 8x8 gradient bits, a 64-bit hash
+
+class PreparedImage:
+    def __init__(self, image_b64: str, mime_type: str, dhash: Optional[int]):
+        self.image_b64 = image_b64
+        self.mime_type = mime_type
+        self.dhash = dhash
+
+_stats_lock = threading.Lock()
+_stats = {"images": 0, "unique": 0, "duplicates": 0, "undecodable": 0, "bytes_in": 0, "bytes_out": 0}
+
+def dhash(image: Image.Image, hash_size: int = DHASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a small grayscale copy."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+def normalize_image(image_b64: str) -> PreparedImage:
+    """Decode once, downscale to IMAGE_MAX_DIMENSION and re-encode as JPEG, or PNG when transparent.
+
+    Images that cannot be decoded are passed through unchanged, without a hash.
+    """
+    try:
+        image = Image.open(io.BytesIO(base64.b64decode(image_b64)))
+        image.load()
+    except Exception as e:
+        print(f"Could not decode image, sending it as is: {e}")
+        return PreparedImage(image_b64, "image/jpeg", None)
+
+    original_mime = Image.MIME.get(image.format, "image/jpeg")
+    image = ImageOps.exif_transpose(image)
+    image_hash = dhash(image)
+    downscaled = max(image.size) > IMAGE_MAX_DIMENSION
+    if downscaled:
+        image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    try:
+        if has_alpha:
+            image.save(buffer, format="PNG", optimize=True)
+            mime_type = "image/png"
+        else:
+            image.convert("RGB").save(buffer, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+            mime_type = "image/jpeg"
+    except Exception as e:
+        print(f"Could not re-encode image, sending it as is: {e}")
+        return PreparedImage(image_b64, original_mime, image_hash)
+
+    normalized_b64 = base64.b64encode(buffer.getvalue()).decode("ascii")
+    # Re-encoding an already small, compact image can make it bigger; then keep the original
+    if not downscaled and len(normalized_b64) >= len(image_b64):
+        return PreparedImage(image_b64, original_mime, image_hash)
+    return PreparedImage(normalized_b64, mime_type, image_hash)
+
+def prepare_images(images: List[str], max_distance: int = IMAGE_DEDUP_MAX_DISTANCE) -> Tuple[List[PreparedImage], List[int]]:
+    """Normalize images and collapse near-duplicates.
+
+    Returns the unique prepared images and, for every input image, the index of the unique
+    image whose summary it should reuse.
+    """
+    unique, mapping = [], []
+    bytes_in = bytes_out = undecodable = 0
+    for image_b64 in images:
+        prepared = normalize_image(image_b64)
+        bytes_in += len(image_b64)
+        if prepared.dhash is None:
+            undecodable += 1
+
+        match = None
+        if prepared.dhash is not None:
+            for index, candidate in enumerate(unique):
+                if candidate.dhash is not None and hamming_distance(candidate.dhash, prepared.dhash) <= max_distance:
+                    match = index
+                    break
+        if match is None:
+            match = len(unique)
+            unique.append(prepared)
+            bytes_out += len(prepared.image_b64)
+        mapping.append(match)
+
+    with _stats_lock:
+        _stats["images"] += len(images)
+        _stats["unique"] += len(unique)
+        _stats["duplicates"] += len(images) - len(unique)
+        _stats["undecodable"] += undecodable
+        _stats["bytes_in"] += bytes_in
+        _stats["bytes_out"] += bytes_out
+    if images:
+        print(f"Prepared {len(images)} images: {len(unique)} unique, {bytes_in} -> {bytes_out} base64 bytes")
+    return unique, mapping
+
+def image_preprocess_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,153 @@
+from langchain_groq import ChatGroq
+from langchain_core.messages import HumanMessage
+from dotenv import load_dotenv
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from src.utils.rate_limiter import rate_limiter, is_rate_limit_error
+from src.utils.image_preprocess import PreparedImage, prepare_images
+from src.utils.summary_cache import lookup_summaries, store_summaries
+
+load_dotenv()
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+if not GROQ_API_KEY:
+    raise ValueError("GROQ_API_KEY not found in environment variables")
+
+VISION_MODEL_NAME = "meta-llama/llama-4-maverick-17b-128e-instruct"
+IMAGE_TOKEN_ESTIMATE = 1500  # Image input plus prompt and response, reserved before each call
+IMAGE_SUMMARY_CONCURRENCY = int(os.getenv("IMAGE_SUMMARY_CONCURRENCY", "4"))  # Vision calls in flight per document
+IMAGE_SUMMARY_RETRIES = int(os.getenv("IMAGE_SUMMARY_RETRIES", "3"))  # Attempts per image
+IMAGE_RETRY_BACKOFF = 1.0  # Seconds before retrying an image after a non rate limit error, doubled each time
+
+# Short description that gets embedded in place of the image itself
+INDEX_CAPTION_PROMPT = (
+    "Describe this image in one or two sentences for a search index. "
+    "Mention any visible text, chart or table subject, and the main objects."
+)
+
+def get_vision_model() -> ChatGroq:
+    return ChatGroq(model_name=VISION_MODEL_NAME, api_key=GROQ_API_KEY)
+
+def summarize_image(image_b64: str, prompt: str, vision_model=None, mime_type: str = "image/jpeg") -> str:
+    """Send one base64 image to the vision model and return its text response."""
+    vision_model = vision_model or get_vision_model()
+    message = HumanMessage(content=[
+        {"type": "text", "text": prompt},
+        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_b64}"}}
+    ])
+    rate_limiter.reserve(VISION_MODEL_NAME, IMAGE_TOKEN_ESTIMATE)
+    try:
+        response = vision_model.invoke([message])
+    except Exception as e:
+        if is_rate_limit_error(e):
+            rate_limiter.penalize(VISION_MODEL_NAME)
+        raise
+    return response.content
+
+async def asummarize_image(image_b64: str, prompt: str, vision_model=None, mime_type: str = "image/jpeg") -> str:
+    """Async variant of summarize_image using ainvoke."""
+    vision_model = vision_model or get_vision_model()
+    message = HumanMessage(content=[
+        {"type": "text", "text": prompt},
+        {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{image_b64}"}}
+    ])
+    await rate_limiter.areserve(VISION_MODEL_NAME, IMAGE_TOKEN_ESTIMATE)
+    try:
+        response = await vision_model.ainvoke([message])
+    except Exception as e:
+        if is_rate_limit_error(e):
+            rate_limiter.penalize(VISION_MODEL_NAME)
+        raise
+    return response.content
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # After a 429 the limiter is drained, so the next reserve() does the waiting
+    return 0.0 if is_rate_limit_error(error) else IMAGE_RETRY_BACKOFF * 2 ** attempt
+
+def summarize_image_with_retry(index: int, image: PreparedImage, prompt: str, vision_model, retries: int = IMAGE_SUMMARY_RETRIES) -> Optional[str]:
+    """summarize_image with up to ``retries`` attempts; None if every attempt failed."""
+    for attempt in range(retries):
+        try:
+            return summarize_image(image.image_b64, prompt, vision_model, image.mime_type)
+        except Exception as e:
+            print(f"Error summarizing image {index} (attempt {attempt + 1}/{retries}): {e}")
+            if attempt < retries - 1:
+                time.sleep(_retry_delay(e, attempt))
+    return None
+
+async def asummarize_image_with_retry(index: int, image: PreparedImage, prompt: str, vision_model, retries: int = IMAGE_SUMMARY_RETRIES) -> Optional[str]:
+    """Async variant of summarize_image_with_retry."""
+    for attempt in range(retries):
+        try:
+            return await asummarize_image(image.image_b64, prompt, vision_model, image.mime_type)
+        except Exception as e:
+            print(f"Error summarizing image {index} (attempt {attempt + 1}/{retries}): {e}")
+            if attempt < retries - 1:
+                await asyncio.sleep(_retry_delay(e, attempt))
+    return None
+
+def summarize_images(images: list, prompt: str, concurrency: int = IMAGE_SUMMARY_CONCURRENCY) -> List[Optional[str]]:
+    """Summarize images in parallel, at most ``concurrency`` vision calls at a time.
+
+    Images are normalized and near-duplicates summarized once, their summary reused for every
+    copy. Results are in input order with None for images that failed every retry, so one bad
+    image does not cost the others. Every call still reserves budget with the shared rate limiter.
+    """
+    if not images:
+        return []
+
+    unique, mapping = prepare_images(images)
+    vision_model = get_vision_model()
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(unique))), thread_name_prefix="image-summary") as pool:
+        summaries = list(pool.map(
+            lambda item: summarize_image_with_retry(item[0], item[1], prompt, vision_model),
+            enumerate(unique)
+        ))
+    return [summaries[index] for index in mapping]
+
+async def asummarize_images(images: list, prompt: str, concurrency: int = IMAGE_SUMMARY_CONCURRENCY) -> List[Optional[str]]:
+    """Async variant of summarize_images, bounded by a semaphore instead of a thread pool."""
+    if not images:
+        return []
+
+    # Decoding and re-encoding is CPU work, keep it off the event loop
+    unique, mapping = await asyncio.to_thread(prepare_images, images)
+    vision_model = get_vision_model()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def summarize(index: int, image: PreparedImage) -> Optional[str]:
+        async with semaphore:
+            return await asummarize_image_with_retry(index, image, prompt, vision_model)
+
+    summaries = await asyncio.gather(*(summarize(i, image) for i, image in enumerate(unique)))
+    return [summaries[index] for index in mapping]
+
+def caption_images(images: list) -> List[Optional[str]]:
+    """One short caption per image, None where every vision call failed.
+
+    Captions are cached by image content, so an image is captioned once whichever upload it
+    arrives with, and the document summary reuses the captions written while indexing.
+    """
+    if not images:
+        return []
+    # The docstore keeps images stripped; key on the same string whichever copy is captioned
+    images = [image.strip() for image in images]
+    keys, captions = lookup_summaries(images, INDEX_CAPTION_PROMPT, VISION_MODEL_NAME, None)
+    missing = [i for i, caption in enumerate(captions) if caption is None]
+    if missing:
+        fresh = summarize_images([images[i] for i in missing], INDEX_CAPTION_PROMPT)
+        for i, caption in zip(missing, fresh):
+            captions[i] = caption.strip() if caption else None
+        store_summaries([keys[i] for i in missing], [captions[i] for i in missing])
+    return captions
+
+def caption_images_for_index(images: list) -> list:
+    """Return one short caption per image, falling back to a placeholder when the vision call fails."""
+    captions = caption_images(images)
+    return [
+        caption.strip() if caption else f"Image {i + 1} from the document (no description available)"
+        for i, caption in enumerate(captions)
+    ]
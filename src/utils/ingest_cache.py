@@ -0,0 +1,52 @@
+import hashlib
+import os
+from array import array
+from typing import List, Optional
+from src.utils.disk_cache import DiskCache
+
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", os.path.join("data", "ingest_cache"))
+INGEST_CACHE_MAX_BYTES = int(os.getenv("INGEST_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Partition output is shared by every mode; summaries are per mode
+_cache = DiskCache(INGEST_CACHE_DIR, INGEST_CACHE_MAX_BYTES, name="ingest-cache")
+
+def file_digest(file_content: bytes) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+def get_cached_extraction(digest: str) -> Optional[dict]:
+    """Texts, tables and images previously extracted from a file with this digest."""
+    return _cache.get(DiskCache.make_key("extraction", digest))
+
+def cache_extraction(digest: str, extracted_content: dict) -> None:
+    _cache.set(DiskCache.make_key("extraction", digest), extracted_content)
+
+def get_cached_index(digest: str) -> Optional[dict]:
+    """Image captions and embedding vectors an earlier upload of a file with this digest was indexed with."""
+    index = _cache.get(DiskCache.make_key("index", digest))
+    if index is None:
+        return None
+    return {"captions": index["captions"], "vectors": [list(vector) for vector in index["vectors"]]}
+
+def cache_index(digest: str, captions: List[str], vectors: List[List[float]]) -> None:
+    # float32 arrays pickle at a fraction of the size of lists of Python floats
+    _cache.set(DiskCache.make_key("index", digest), {
+        "captions": captions,
+        "vectors": [array("f", vector) for vector in vectors]
+    })
+
+def get_cached_image_analysis(digest: str) -> Optional[dict]:
+    """visuaLens OCR/caption/summary of an image with this digest, whichever session indexed it."""
+    return _cache.get(DiskCache.make_key("image-analysis", digest))
+
+def cache_image_analysis(digest: str, result: dict) -> None:
+    _cache.set(DiskCache.make_key("image-analysis", digest), result)
+
+def get_cached_result(digest: str, mode: str) -> Optional[dict]:
+    """Summaries from an earlier upload of the same file and mode; every upload still gets its own session."""
+    return _cache.get(DiskCache.make_key("result", digest, mode))
+
+def cache_result(digest: str, mode: str, result) -> None:
+    _cache.set(DiskCache.make_key("result", digest, mode), {"result": result})
+
+def ingest_cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+JOB_STATE_DIR = os.getenv("JOB_STATE_DIR", os.path.join("data", "jobs"))
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "4"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETAINED = 1000
+
+class Job:
+    def __init__(self, job_id: str, kind: str, owner: Optional[str]):
+        self.id = job_id
+        self.kind = kind
+        self.owner = owner
+        self.status = "queued"
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "owner": self.owner,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+class JobManager:
+    """Runs ingestion coroutines as background tasks and tracks their stage and progress.
+
+    Blocking work inside a job is expected to go through the threadpool, so the event loop keeps
+    serving other requests. Job state is mirrored to JOB_STATE_DIR so any worker can report on a
+    job, whichever worker accepted it.
+    """
+
+    def __init__(self, max_concurrency: int = JOB_MAX_CONCURRENCY, state_dir: str = JOB_STATE_DIR):
+        self.max_concurrency = max_concurrency
+        self.state_dir = state_dir
+        self._jobs = OrderedDict()
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._semaphore = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def submit(self, kind: str, owner: Optional[str], work: Callable[[Callable[[str, float], None]], Awaitable]) -> Job:
+        """Start ``work(report)`` in the background; ``report(stage, progress)`` updates the job."""
+        job = Job(uuid.uuid4().hex, kind, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_locked()
+        self._save(job)
+
+        task = asyncio.get_running_loop().create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: Job, work) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        def report(stage: str, progress: float) -> None:
+            job.stage = stage
+            job.progress = max(job.progress, min(progress, 1.0))
+            job.updated_at = time.time()
+            self._save(job)
+
+        async with self._semaphore:
+            job.status = "running"
+            report("starting", 0.0)
+            try:
+                job.result = await work(report)
+                job.status = "completed"
+                report("done", 1.0)
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                print(f"Job {job.id} failed: {detail}")
+                job.status = "failed"
+                job.error = detail
+                report(job.stage, job.progress)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return self._load(job_id)
+
+    def _path(self, job_id: str) -> Optional[str]:
+        if not self.state_dir or not job_id.isalnum():
+            return None
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job: Job) -> None:
+        path = self._path(job.id)
+        if not path:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(job.to_dict(), f, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Could not save state of job {job.id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        path = self._path(job_id)
+        if not path:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def _prune_locked(self) -> None:
+        # Oldest first: drop finished jobs past retention, or to get back under the cap
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            finished = job.status in ("completed", "failed")
+            if finished and (job.updated_at < cutoff or len(self._jobs) > JOB_MAX_RETAINED):
+                del self._jobs[job_id]
+                path = self._path(job_id)
+                if path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_concurrency": self.max_concurrency, "jobs": counts}
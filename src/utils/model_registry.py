@@ -0,0 +1,151 @@
+import gc
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+MODEL_IDLE_UNLOAD_SECONDS = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0"))  # 0 keeps models loaded for good
+MODEL_REAP_INTERVAL = 60  # Seconds between idle checks
+
+def estimate_model_bytes(obj: Any) -> int:
+    """Parameter and buffer bytes of the torch modules inside a loaded model object."""
+    seen = set()
+    total = 0
+
+    def visit(candidate, depth=0):
+        nonlocal total
+        if candidate is None or depth > 2 or id(candidate) in seen:
+            return
+        seen.add(id(candidate))
+        if hasattr(candidate, "parameters") and hasattr(candidate, "buffers"):
+            try:
+                for tensor in list(candidate.parameters()) + list(candidate.buffers()):
+                    total += tensor.numel() * tensor.element_size()
+                return
+            except Exception:
+                pass
+        if isinstance(candidate, (tuple, list)):
+            for item in candidate:
+                visit(item, depth + 1)
+        elif hasattr(candidate, "model"):
+            # transformers pipelines keep their module on .model
+            visit(candidate.model, depth + 1)
+
+    visit(obj)
+    return total
+
+class ModelEntry:
+    def __init__(self, name: str, loader: Callable[[], Any], runtime_of: Optional[Callable[[Any], str]] = None):
+        self.name = name
+        self.loader = loader
+        self.runtime_of = runtime_of
+        self.runtime = None
+        self.model = None
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.unloads = 0
+        self.load_seconds = None
+        self.nbytes = 0
+        self.last_used = 0.0
+
+class ModelRegistry:
+    """Named models loaded on first use, or up front through ``warmup``, one copy per process.
+
+    Loading happens under a per-model lock, so concurrent first requests wait for a single load
+    instead of each loading their own copy. With ``idle_unload_seconds`` set, a background thread
+    drops models nobody has used for that long; the next request loads them again. Callers that
+    still hold a reference keep using it until they are done.
+    """
+
+    def __init__(self, idle_unload_seconds: float = MODEL_IDLE_UNLOAD_SECONDS):
+        self.idle_unload_seconds = idle_unload_seconds
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name: str, loader: Callable[[], Any], runtime_of: Optional[Callable[[Any], str]] = None) -> None:
+        """``runtime_of`` names the runtime a loaded model actually uses, reported by ``stats``."""
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = ModelEntry(name, loader, runtime_of)
+
+    def get(self, name: str) -> Any:
+        entry = self._entries[name]
+        entry.last_used = time.monotonic()
+        model = entry.model
+        if model is not None:
+            return model
+
+        with entry.lock:
+            if entry.model is None:
+                start = time.perf_counter()
+                entry.model = entry.loader()
+                entry.load_seconds = round(time.perf_counter() - start, 2)
+                entry.nbytes = estimate_model_bytes(entry.model)
+                entry.runtime = entry.runtime_of(entry.model) if entry.runtime_of else None
+                entry.loads += 1
+                print(f"Loaded model {name} in {entry.load_seconds:.2f}s ({entry.nbytes / 1024 ** 2:.0f} MB, {entry.runtime or 'unknown runtime'})")
+            entry.last_used = time.monotonic()
+            model = entry.model
+        self._start_reaper()
+        return model
+
+    def warmup(self, names: Optional[Iterable[str]] = None) -> None:
+        """Load the named models (all registered ones by default) before traffic arrives."""
+        for name in list(names or self._entries):
+            self.get(name)
+
+    def unload(self, name: str) -> bool:
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.model is None:
+                return False
+            entry.model = None
+            entry.nbytes = 0
+            entry.unloads += 1
+        gc.collect()
+        print(f"Unloaded model {name}")
+        return True
+
+    def unload_idle(self) -> list:
+        if self.idle_unload_seconds <= 0:
+            return []
+        cutoff = time.monotonic() - self.idle_unload_seconds
+        return [
+            name for name, entry in list(self._entries.items())
+            if entry.model is not None and entry.last_used < cutoff and self.unload(name)
+        ]
+
+    def _start_reaper(self) -> None:
+        if self.idle_unload_seconds <= 0 or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap(self) -> None:
+        while True:
+            time.sleep(min(MODEL_REAP_INTERVAL, self.idle_unload_seconds))
+            try:
+                self.unload_idle()
+            except Exception as e:
+                print(f"Error unloading idle models: {e}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            name: {
+                "loaded": entry.model is not None,
+                "runtime": entry.runtime,
+                "load_seconds": entry.load_seconds,
+                "bytes": entry.nbytes,
+                "loads": entry.loads,
+                "unloads": entry.unloads,
+                "idle_seconds": round(now - entry.last_used, 1) if entry.last_used else None,
+            }
+            for name, entry in list(self._entries.items())
+        }
+
+# Process-wide registry for the local transformers models
+model_registry = ModelRegistry()
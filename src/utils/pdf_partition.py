@@ -0,0 +1,263 @@
+import io
+import os
+import re
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple
+from pypdf import PdfReader, PdfWriter
+from unstructured.partition.pdf import partition_pdf
+from unstructured.chunking.title import chunk_by_title
+
+# Every partition process loads its own hi_res layout and OCR models, roughly 1 GB of RSS each,
+# and every uvicorn worker has its own pool; raise this only with the memory to match
+PDF_PARTITION_WORKERS = int(os.getenv("PDF_PARTITION_WORKERS", str(min(2, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))  # Smaller PDFs are not worth the fan-out
+PDF_ADAPTIVE_STRATEGY = os.getenv("PDF_ADAPTIVE_STRATEGY", "true").lower() == "true"
+MIN_TEXT_LAYER_CHARS = 200  # Fewer extractable characters than this means a scanned or mostly graphic page
+TABLE_RULE_OPERATORS = 20  # Rectangles and line strokes on a page before it is treated as holding a table
+TABLE_ALIGNED_LINES = 4  # Text lines with column-like gaps before it is treated as holding a table
+
+# Same element extraction and by_title chunking settings for the serial and parallel paths
+PARTITION_KWARGS = dict(
+    infer_table_structure=True,
+    extract_image_block_types=["Image"],
+    extract_image_block_to_payload=True,
+)
+CHUNKING_KWARGS = dict(
+    max_characters=10000,
+    combine_text_under_n_chars=2000,
+    new_after_n_chars=6000,
+)
+
+DRAWING_OPERATORS = re.compile(rb"\s(?:re|l)\s")
+INLINE_IMAGE_OPERATOR = re.compile(rb"(?:^|\s)BI\s")  # Begins an image embedded in the content stream
+MAX_FORM_DEPTH = 8  # Nested Form XObjects followed before assuming the page has images
+COLUMN_GAP = re.compile(r"\S(?: {3,}|\t)\S")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def count_pdf_pages(file_content: bytes) -> int:
+    return len(PdfReader(io.BytesIO(file_content)).pages)
+
+def split_pdf_pages(file_content: bytes, page_ranges: List[Tuple[int, int]]) -> List[bytes]:
+    """Write each 1-based, inclusive page range of the PDF out as its own PDF."""
+    reader = PdfReader(io.BytesIO(file_content))
+    parts = []
+    for start, end in page_ranges:
+        writer = PdfWriter()
+        for page_index in range(start - 1, end):
+            writer.add_page(reader.pages[page_index])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        parts.append(buffer.getvalue())
+    return parts
+
+def _resources_have_images(resources, depth: int = 0) -> bool:
+    """Whether these resources draw an image, directly or through nested Form XObjects."""
+    if depth > MAX_FORM_DEPTH:
+        return True
+    xobjects = resources.get_object().get("/XObject") if resources else None
+    if not xobjects:
+        return False
+    for xobject in xobjects.get_object().values():
+        xobject = xobject.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            return True
+        if subtype == "/Form":
+            if INLINE_IMAGE_OPERATOR.search(xobject.get_data()):
+                return True
+            if _resources_have_images(xobject.get("/Resources"), depth + 1):
+                return True
+    return False
+
+def _page_has_images(page) -> bool:
+    try:
+        if _resources_have_images(page.get("/Resources")):
+            return True
+        contents = page.get_contents()
+        return bool(contents is not None and INLINE_IMAGE_OPERATOR.search(contents.get_data()))
+    except Exception:
+        # Unreadable resources: let hi_res look at the page
+        return True
+
+def _page_likely_has_table(page, text: str) -> bool:
+    try:
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+    except Exception:
+        data = b""
+    if len(DRAWING_OPERATORS.findall(data)) >= TABLE_RULE_OPERATORS:
+        return True
+    aligned_lines = sum(1 for line in text.splitlines() if COLUMN_GAP.search(line))
+    return aligned_lines >= TABLE_ALIGNED_LINES
+
+def analyze_pdf_pages(file_content: bytes) -> List[dict]:
+    """Pick a partition strategy per page from its text layer, embedded images and table hints.
+
+    Pages with a usable text layer and nothing that needs layout detection go to the fast
+    strategy; scanned pages and pages with images or likely tables go to hi_res.
+    """
+    reader = PdfReader(io.BytesIO(file_content))
+    pages = []
+    for page_number, page in enumerate(reader.pages, start=1):
+        try:
+            text = page.extract_text() or ""
+        except Exception:
+            text = ""
+        has_text_layer = len(text.strip()) >= MIN_TEXT_LAYER_CHARS
+        has_images = _page_has_images(page)
+        likely_table = _page_likely_has_table(page, text)
+
+        if not has_text_layer:
+            strategy, reason = "hi_res", "no_text_layer"
+        elif has_images:
+            strategy, reason = "hi_res", "images"
+        elif likely_table:
+            strategy, reason = "hi_res", "tables"
+        else:
+            strategy, reason = "fast", "text_layer"
+        pages.append({"page": page_number, "strategy": strategy, "reason": reason})
+    return pages
+
+def strategy_runs(pages: List[dict], pages_per_task: int) -> List[Tuple[int, int, str]]:
+    """Group consecutive pages with the same strategy into ranges of at most ``pages_per_task``."""
+    runs = []
+    for page in pages:
+        if runs and runs[-1][2] == page["strategy"] and page["page"] - runs[-1][0] < pages_per_task:
+            runs[-1] = (runs[-1][0], page["page"], page["strategy"])
+        else:
+            runs.append((page["page"], page["page"], page["strategy"]))
+    return runs
+
+def partition_stats(pages: List[dict]) -> dict:
+    strategies = {"fast": 0, "hi_res": 0}
+    reasons = {}
+    for page in pages:
+        strategies[page["strategy"]] = strategies.get(page["strategy"], 0) + 1
+        reasons[page["reason"]] = reasons.get(page["reason"], 0) + 1
+    return {
+        "pages": len(pages),
+        "strategy_pages": strategies,
+        "reasons": reasons,
+        "page_strategies": {page["page"]: page["strategy"] for page in pages},
+    }
+
+def partition_pdf_serial(file_content: bytes, strategy: str = "hi_res"):
+    """Partition and chunk the whole PDF in this process."""
+    return partition_pdf(
+        file=io.BytesIO(file_content),
+        strategy=strategy,
+        chunking_strategy="by_title",
+        **PARTITION_KWARGS,
+        **CHUNKING_KWARGS,
+    )
+
+def partition_page_range(part_content: bytes, first_page: int, strategy: str = "hi_res") -> list:
+    """Partition one page range without chunking and renumber its pages to the original document."""
+    elements = partition_pdf(file=io.BytesIO(part_content), strategy=strategy, **PARTITION_KWARGS)
+    for element in elements:
+        page_number = getattr(element.metadata, "page_number", None)
+        if page_number is not None:
+            element.metadata.page_number = page_number + first_page - 1
+    return elements
+
+def _init_worker(threads: int) -> None:
+    # Split the cores between workers instead of every worker's torch grabbing all of them
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+def get_partition_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                threads = max(1, (os.cpu_count() or 1) // max(1, PDF_PARTITION_WORKERS))
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_PARTITION_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+    return _pool
+
+def reset_partition_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool that lost a worker (e.g. OOM-killed while loading models); the next PDF spawns a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def partition_pdf_ranges(file_content: bytes, runs: List[Tuple[int, int, str]], parallel: bool) -> list:
+    """Partition each (first page, last page, strategy) range and merge the elements in page order."""
+    parts = split_pdf_pages(file_content, [(start, end) for start, end, _ in runs])
+
+    if parallel:
+        pool = get_partition_pool()
+        try:
+            futures = [
+                pool.submit(partition_page_range, part, start, strategy)
+                for part, (start, _, strategy) in zip(parts, runs)
+            ]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            reset_partition_pool(pool)
+            raise
+    else:
+        results = [
+            partition_page_range(part, start, strategy)
+            for part, (start, _, strategy) in zip(parts, runs)
+        ]
+
+    elements = []
+    for range_elements in results:
+        elements.extend(range_elements)
+    return elements
+
+def partition_pdf_chunks(file_content: bytes):
+    """Chunked elements for a PDF plus per-page strategy stats.
+
+    With PDF_ADAPTIVE_STRATEGY, pages are routed to fast or hi_res individually; longer documents
+    fan out across worker processes either way.
+    """
+    try:
+        pages = analyze_pdf_pages(file_content) if PDF_ADAPTIVE_STRATEGY else None
+        page_count = len(pages) if pages is not None else count_pdf_pages(file_content)
+    except Exception as e:
+        print(f"Could not inspect PDF pages, partitioning whole document with hi_res: {e}")
+        return partition_pdf_serial(file_content), None
+
+    if pages is None:
+        pages = [{"page": page, "strategy": "hi_res", "reason": "adaptive_disabled"} for page in range(1, page_count + 1)]
+    stats = partition_stats(pages)
+    strategies = {page["strategy"] for page in pages}
+    parallel = PDF_PARTITION_WORKERS > 1 and page_count >= PDF_PARALLEL_MIN_PAGES
+
+    if len(strategies) == 1 and not parallel:
+        # One strategy for the whole small document: no need to split it
+        return partition_pdf_serial(file_content, strategies.pop()), stats
+
+    pages_per_task = PDF_PAGES_PER_TASK
+    if parallel:
+        pages_per_task = min(PDF_PAGES_PER_TASK, -(-page_count // PDF_PARTITION_WORKERS))
+    runs = strategy_runs(pages, pages_per_task)
+
+    try:
+        elements = partition_pdf_ranges(file_content, runs, parallel)
+    except BrokenProcessPool as e:
+        print(f"PDF partition worker died, partitioning this document in process: {e}")
+        return partition_pdf_serial(file_content), None
+    print(
+        f"Partitioned {page_count} pages in {len(runs)} ranges "
+        f"({stats['strategy_pages']['fast']} fast, {stats['strategy_pages']['hi_res']} hi_res)"
+    )
+    return chunk_by_title(elements, **CHUNKING_KWARGS), stats
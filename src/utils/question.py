@@ -1,11 +1,11 @@
 import os
+import asyncio
 import base64
 import io
 import time
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 from PIL import Image
 from dotenv import load_dotenv
-import tiktoken
 
 from langchain.schema.document import Document
 from langchain_community.llms import Ollama
@@ -14,54 +14,38 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from src.utils.rate_limiter import rate_limiter, is_rate_limit_error
+from src.utils.tokenizer import count_tokens, split_on_tokens, truncate_to_tokens
 
 load_dotenv()
 
 # CRITICAL: Updated rate limiting configuration for Groq
 MAX_TOKENS_PER_CHUNK = 800  # Reduced from 1500
-ENCODER = tiktoken.encoding_for_model("gpt-4")
 # CRITICAL: Reduced total context to leave more room for prompt template and response
 MAX_CONTEXT_TOKENS = 3500  # Reduced from 6000 to account for Groq's 6000 TPM limit
 GROQ_RATE_LIMIT = 6000  # Groq's actual limit
 PROMPT_OVERHEAD = 800  # Estimated tokens for prompt template
 RESPONSE_BUFFER = 1000  # Buffer for model response
-
-def estimate_tokens(text: str) -> int:
-    """Estimate token count for given text"""
-    return len(ENCODER.encode(text))
+QA_MODEL_NAME = "llama3-70b-8192"
+QA_MAX_OUTPUT_TOKENS = 800
 
 def calculate_safe_context_limit(question: str) -> int:
     """Calculate how many tokens we can safely use for context"""
-    question_tokens = estimate_tokens(question)
+    question_tokens = count_tokens(question)
     available_tokens = GROQ_RATE_LIMIT - question_tokens - PROMPT_OVERHEAD - RESPONSE_BUFFER
     return max(available_tokens, 1000)  # Minimum 1000 tokens for context
 
 def chunk_text(text: str, max_tokens: int = MAX_TOKENS_PER_CHUNK) -> List[str]:
     """Split text into chunks based on token limit"""
-    words = text.split()
-    chunks, chunk = [], []
-    tokens = 0
-
-    for word in words:
-        word_tokens = estimate_tokens(word + " ")
-        if tokens + word_tokens > max_tokens:
-            if chunk:  # Only append if chunk is not empty
-                chunks.append(" ".join(chunk))
-                chunk, tokens = [], 0
-        chunk.append(word)
-        tokens += word_tokens
-
-    if chunk:
-        chunks.append(" ".join(chunk))
-    return chunks
+    return split_on_tokens(text, max_tokens)
 
 def get_llm():
     """Initialize and return the LLM based on available configuration"""
     if os.getenv("GROQ_API_KEY"):
         return ChatGroq(
-            model="llama3-70b-8192",
+            model=QA_MODEL_NAME,
             temperature=0,
-            max_tokens=800,  # Reduced from 1000
+            max_tokens=QA_MAX_OUTPUT_TOKENS,  # Reduced from 1000
             api_key=os.getenv("GROQ_API_KEY")
         )
     try:
@@ -79,6 +63,12 @@ class MockLLM:
             'content': "This is a mock response. Please configure Groq API key or Ollama to get actual responses."
         })()
 
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+    async def astream(self, messages):
+        yield self.invoke(messages)
+
 def process_image_content(image_b64: str) -> str:
     """Process base64 image and return description"""
     try:
@@ -139,7 +129,7 @@ def preprocess_context_with_sources(context: str, question: str, relevant_docs:
     safe_context_limit = calculate_safe_context_limit(question)
     
     # Check if context fits within available tokens
-    context_tokens = estimate_tokens(context)
+    context_tokens = count_tokens(context)
     
     sources_used = []
     
@@ -166,7 +156,7 @@ def preprocess_context_with_sources(context: str, question: str, relevant_docs:
     current_tokens = 0
     
     for i, section in enumerate(sections):
-        section_tokens = estimate_tokens(section)
+        section_tokens = count_tokens(section)
         
         if current_tokens + section_tokens <= safe_context_limit:
             optimized_parts.append(section)
@@ -183,9 +173,9 @@ def preprocess_context_with_sources(context: str, question: str, relevant_docs:
             
             if remaining_tokens > 100:  # Only if we have reasonable space left
                 # Chunk the section and take what fits
-                section_chunks = chunk_text(section, remaining_tokens - 20)  # Leave some buffer
-                if section_chunks:
-                    optimized_parts.append(section_chunks[0] + "... [truncated]")
+                truncated_section = truncate_to_tokens(section, remaining_tokens - 20)  # Leave some buffer
+                if truncated_section:
+                    optimized_parts.append(truncated_section + "... [truncated]")
                     
                     # Track source for truncated content
                     if relevant_docs and i < len(relevant_docs):
@@ -198,8 +188,8 @@ def preprocess_context_with_sources(context: str, question: str, relevant_docs:
     
     if not optimized_parts:
         # Fallback: take first chunk of the entire context
-        context_chunks = chunk_text(context, safe_context_limit)
-        context_result = context_chunks[0] + "... [truncated due to length]" if context_chunks else ""
+        context_result = truncate_to_tokens(context, safe_context_limit)
+        context_result = context_result + "... [truncated due to length]" if context_result else ""
         
         # Add generic source info if available
         if relevant_docs and len(relevant_docs) > 0:
@@ -211,7 +201,7 @@ def preprocess_context_with_sources(context: str, question: str, relevant_docs:
         return context_result, sources_used
     
     final_context = '\n\n'.join(optimized_parts)
-    final_tokens = estimate_tokens(final_context)
+    final_tokens = count_tokens(final_context)
     print(f"Final context tokens: {final_tokens}")
     
     return final_context, sources_used
@@ -229,7 +219,8 @@ def preprocess_documents_with_chunking_and_sources(relevant_docs: List[Document]
         elif doc_type == "table":
             content = f"Table Content: {doc.page_content}"
         elif doc_type == "image":
-            image_description = process_image_content(doc.page_content)
+            # Prefer the caption indexed for this image over generic image properties
+            image_description = doc.metadata.get("summary") or process_image_content(doc.page_content)
             content = f"Image Content: {image_description}"
         else:
             content = f"Content: {doc.page_content}"
@@ -238,7 +229,7 @@ def preprocess_documents_with_chunking_and_sources(relevant_docs: List[Document]
         source_text = doc.page_content.strip()
         
         # Check if content exceeds token limit and chunk if necessary
-        if estimate_tokens(content) > MAX_TOKENS_PER_CHUNK:
+        if count_tokens(content) > MAX_TOKENS_PER_CHUNK:
             chunks = chunk_text(content, MAX_TOKENS_PER_CHUNK)
             for j, chunk in enumerate(chunks):
                 processed_chunks.append(f"[{i}] {chunk}")
@@ -262,7 +253,7 @@ def create_optimized_context_with_sources(processed_chunks: List[str], sources_t
     
     # Prioritize chunks (you could implement relevance scoring here)
     for i, chunk in enumerate(processed_chunks):
-        chunk_tokens = estimate_tokens(chunk)
+        chunk_tokens = count_tokens(chunk)
         
         if current_tokens + chunk_tokens <= safe_context_limit:
             context_parts.append(chunk)
@@ -274,20 +265,11 @@ def create_optimized_context_with_sources(processed_chunks: List[str], sources_t
             # If we can't fit the whole chunk, try to fit a truncated version
             remaining_tokens = safe_context_limit - current_tokens
             if remaining_tokens > 100:  # Only if we have reasonable space left
-                words = chunk.split()
-                truncated_chunk = []
-                temp_tokens = 0
-                
-                for word in words:
-                    word_tokens = estimate_tokens(word + " ")
-                    if temp_tokens + word_tokens <= remaining_tokens:
-                        truncated_chunk.append(word)
-                        temp_tokens += word_tokens
-                    else:
-                        break
+                truncated_chunk = truncate_to_tokens(chunk, remaining_tokens)
                 
                 if truncated_chunk:
-                    context_parts.append(" ".join(truncated_chunk) + "... [truncated]")
+                    context_parts.append(truncated_chunk + "... [truncated]")
+                    current_tokens += count_tokens(context_parts[-1])
                     # Add corresponding source text (truncated) if available
                     if i < len(sources_text):
                         source_text = sources_text[i]
@@ -297,15 +279,16 @@ def create_optimized_context_with_sources(processed_chunks: List[str], sources_t
             break
     
     final_context = "\n\n".join(context_parts)
-    final_tokens = estimate_tokens(final_context)
-    print(f"Final optimized context tokens: {final_tokens}")
+    # Estimated from the part counts; the joined string is only encoded if a later check needs it
+    final_tokens = current_tokens + max(len(context_parts) - 1, 0)
+    print(f"Final optimized context tokens (estimated): {final_tokens}")
     
     return final_context, sources_used
 
 def validate_request_size(question: str, context: str) -> bool:
     """Validate that the total request size is within Groq limits"""
-    question_tokens = estimate_tokens(question)
-    context_tokens = estimate_tokens(context)
+    question_tokens = count_tokens(question)
+    context_tokens = count_tokens(context)
     
     # Account for prompt template overhead
     prompt_template_sample = """
@@ -330,7 +313,7 @@ Guidelines:
 
 Answer:"""
     
-    template_tokens = estimate_tokens(prompt_template_sample.replace("{context}", "").replace("{question}", ""))
+    template_tokens = count_tokens(prompt_template_sample.replace("{context}", "").replace("{question}", ""))
     total_tokens = question_tokens + context_tokens + template_tokens
     
     print(f"Token breakdown - Question: {question_tokens}, Context: {context_tokens}, Template: {template_tokens}, Total: {total_tokens}")
@@ -338,6 +321,96 @@ Answer:"""
     # Leave buffer for response
     return total_tokens < (GROQ_RATE_LIMIT - RESPONSE_BUFFER)
 
+QA_PROMPT_TEMPLATE = PromptTemplate(
+    input_variables=["question", "context"],
+    # Shorter prompt template to save tokens
+    template="""Based on the document content below, answer the question. Include reference numbers [0], [1], etc. when citing.
+
+Context:
+{context}
+
+Question: {question}
+
+Answer:"""
+)
+QA_MAX_RETRIES = 3
+
+def prepare_answer_context(question: str, context: str, relevant_docs: Optional[List[Document]] = None) -> tuple[str, List[str]]:
+    """Fit the context to the token budget and collect the clean text sources it came from."""
+    # Preprocess the context to fit within token limits and track clean text sources
+    optimized_context, sources_used = preprocess_context_with_sources(context, question, relevant_docs)
+
+    # Validate request size before sending
+    if not validate_request_size(question, optimized_context):
+        print("Request still too large after optimization, further reducing context...")
+        # Emergency context reduction
+        emergency_limit = calculate_safe_context_limit(question) // 2
+        optimized_context = truncate_to_tokens(optimized_context, emergency_limit)
+        optimized_context = optimized_context + "... [heavily truncated due to size limits]" if optimized_context else ""
+
+    return optimized_context, sources_used
+
+def format_answer_prompt(question: str, optimized_context: str) -> str:
+    formatted_prompt = QA_PROMPT_TEMPLATE.format(question=question, context=optimized_context)
+
+    # Final validation, estimated from counts already taken for the question and context
+    template_tokens = count_tokens(QA_PROMPT_TEMPLATE.template.replace("{context}", "").replace("{question}", ""))
+    final_tokens = template_tokens + count_tokens(question) + count_tokens(optimized_context)
+    print(f"Final request tokens (estimated): {final_tokens}")
+
+    if final_tokens >= GROQ_RATE_LIMIT - RESPONSE_BUFFER:
+        # Emergency fallback - use only first 1000 tokens of context
+        emergency_context = truncate_to_tokens(optimized_context, 1000)
+        formatted_prompt = QA_PROMPT_TEMPLATE.format(
+            question=question,
+            context=emergency_context + "... [emergency truncation]"
+        )
+        print(f"Emergency truncation applied. New token count: {count_tokens(formatted_prompt)}")
+    return formatted_prompt
+
+def build_answer_prompt(question: str, optimized_context: str) -> Tuple[str, int]:
+    """Formatted prompt and its token count, for callers that reserve rate limit budget with it."""
+    formatted_prompt = format_answer_prompt(question, optimized_context)
+    return formatted_prompt, count_tokens(formatted_prompt)
+
+def shrink_context(optimized_context: str) -> str:
+    """Halve the context before retrying a request that was rate limited or too large."""
+    return truncate_to_tokens(optimized_context, len(optimized_context.split()) // 2)
+
+def should_retry_answer(error: Exception, attempt: int) -> bool:
+    """Whether a failed QA call is worth another attempt; penalizes the limiter on a 429."""
+    print(f"Attempt {attempt + 1} failed: {error}")
+    if not (is_rate_limit_error(error) or "request too large" in str(error).lower()):
+        # For non-rate-limit errors, don't retry
+        raise error
+    if attempt >= QA_MAX_RETRIES - 1:
+        return False
+    print("Rate limit hit. Retrying once the rate limiter has budget again...")
+    if is_rate_limit_error(error):
+        rate_limiter.penalize(QA_MODEL_NAME)
+    return True
+
+def answer_result(answer: str, sources_used: List[str]) -> Dict[str, Any]:
+    # Return clean response with text-only sources
+    return {
+        'answer': answer,
+        'sources': sources_used,  # Now contains only clean text content
+        'total_sources': len(sources_used)
+    }
+
+TOO_LARGE_RESULT = {
+    'answer': "I apologize, but the request is too large for the current rate limits. Please try with a shorter question or smaller document.",
+    'sources': [],
+    'total_sources': 0
+}
+
+def error_result(error: Exception) -> Dict[str, Any]:
+    return {
+        'answer': f"I apologize, but I encountered an error while processing your question: {str(error)}.",
+        'sources': [],
+        'total_sources': 0
+    }
+
 def answer_question_with_sources(question: str, context: str, relevant_docs: Optional[List[Document]] = None) -> Dict[str, Any]:
     """
     Enhanced answer_question function that returns both answer and clean text sources
@@ -352,104 +425,62 @@ def answer_question_with_sources(question: str, context: str, relevant_docs: Opt
     """
     try:
         llm = get_llm()
-        
-        # Preprocess the context to fit within token limits and track clean text sources
-        optimized_context, sources_used = preprocess_context_with_sources(context, question, relevant_docs)
-        
-        # Validate request size before sending
-        if not validate_request_size(question, optimized_context):
-            print("Request still too large after optimization, further reducing context...")
-            # Emergency context reduction
-            emergency_limit = calculate_safe_context_limit(question) // 2
-            context_chunks = chunk_text(optimized_context, emergency_limit)
-            optimized_context = context_chunks[0] + "... [heavily truncated due to size limits]" if context_chunks else ""
-        
-        # Shorter prompt template to save tokens
-        prompt_template = PromptTemplate(
-            input_variables=["question", "context"],
-            template="""Based on the document content below, answer the question. Include reference numbers [0], [1], etc. when citing.
+        optimized_context, sources_used = prepare_answer_context(question, context, relevant_docs)
 
-Context:
-{context}
-
-Question: {question}
-
-Answer:"""
-        )
-
-        # Implement retry logic with exponential backoff for rate limiting
-        max_retries = 3
-        backoff_time = 2  # Start with 2 seconds
-        
-        for attempt in range(max_retries):
+        # Retry on rate limiting; the shared rate limiter decides how long to wait
+        for attempt in range(QA_MAX_RETRIES):
             try:
                 if hasattr(llm, 'invoke'):
-                    formatted_prompt = prompt_template.format(
-                        question=question, 
-                        context=optimized_context
-                    )
-                    
-                    # Final validation
-                    final_tokens = estimate_tokens(formatted_prompt)
-                    print(f"Final request tokens: {final_tokens}")
-                    
-                    if final_tokens >= GROQ_RATE_LIMIT - RESPONSE_BUFFER:
-                        # Emergency fallback - use only first 1000 tokens of context
-                        emergency_context = chunk_text(optimized_context, 1000)[0] if optimized_context else ""
-                        formatted_prompt = prompt_template.format(
-                            question=question, 
-                            context=emergency_context + "... [emergency truncation]"
-                        )
-                        print(f"Emergency truncation applied. New token count: {estimate_tokens(formatted_prompt)}")
-                    
+                    formatted_prompt = format_answer_prompt(question, optimized_context)
+                    if isinstance(llm, ChatGroq):
+                        rate_limiter.reserve(QA_MODEL_NAME, count_tokens(formatted_prompt) + QA_MAX_OUTPUT_TOKENS)
                     response = llm.invoke(formatted_prompt)
                     answer = response.content if hasattr(response, 'content') else str(response)
                 else:
-                    chain = LLMChain(llm=llm, prompt=prompt_template)
+                    chain = LLMChain(llm=llm, prompt=QA_PROMPT_TEMPLATE)
                     answer = chain.run(question=question, context=optimized_context)
-                
-                # Return clean response with text-only sources
-                return {
-                    'answer': answer,
-                    'sources': sources_used,  # Now contains only clean text content
-                    'total_sources': len(sources_used)
-                }
-                    
+                return answer_result(answer, sources_used)
+
             except Exception as e:
-                error_msg = str(e)
-                print(f"Attempt {attempt + 1} failed: {error_msg}")
-                
-                # Check if it's a rate limit error
-                if ("rate_limit_exceeded" in error_msg.lower() or 
-                    "rate limit reached" in error_msg.lower() or
-                    "too many requests" in error_msg.lower() or
-                    "request too large" in error_msg.lower()):
-                    
-                    if attempt < max_retries - 1:
-                        print(f"Rate limit hit. Waiting for {backoff_time}s before retrying...")
-                        time.sleep(backoff_time)
-                        backoff_time = min(backoff_time * 2, 60)  # Exponential backoff, max 60s
-                        
-                        # Reduce context size for retry
-                        optimized_context = chunk_text(optimized_context, len(optimized_context.split()) // 2)[0] if optimized_context else ""
-                        continue
-                    else:
-                        return {
-                            'answer': "I apologize, but the request is too large for the current rate limits. Please try with a shorter question or smaller document.",
-                            'sources': [],
-                            'total_sources': 0
-                        }
-                else:
-                    # For non-rate-limit errors, don't retry
-                    raise e
+                if not should_retry_answer(e, attempt):
+                    return dict(TOO_LARGE_RESULT)
+                # Reduce context size for retry
+                optimized_context = shrink_context(optimized_context)
 
     except Exception as e:
         print(f"Error in answer_question_with_sources: {e}")
-        return {
-            'answer': f"I apologize, but I encountered an error while processing your question: {str(e)}.",
-            'sources': [],
-            'total_sources': 0
-        }
+        return error_result(e)
+
+async def aanswer_question_with_sources(question: str, context: str, relevant_docs: Optional[List[Document]] = None) -> Dict[str, Any]:
+    """Async variant of answer_question_with_sources; waits on the rate limiter and the LLM without blocking the event loop.
+
+    Fitting the context and counting tokens are CPU work and run in a worker thread.
+    """
+    try:
+        llm = get_llm()
+        optimized_context, sources_used = await asyncio.to_thread(prepare_answer_context, question, context, relevant_docs)
+
+        for attempt in range(QA_MAX_RETRIES):
+            try:
+                if hasattr(llm, 'ainvoke'):
+                    formatted_prompt, prompt_tokens = await asyncio.to_thread(build_answer_prompt, question, optimized_context)
+                    if isinstance(llm, ChatGroq):
+                        await rate_limiter.areserve(QA_MODEL_NAME, prompt_tokens + QA_MAX_OUTPUT_TOKENS)
+                    response = await llm.ainvoke(formatted_prompt)
+                    answer = response.content if hasattr(response, 'content') else str(response)
+                else:
+                    chain = LLMChain(llm=llm, prompt=QA_PROMPT_TEMPLATE)
+                    answer = await chain.arun(question=question, context=optimized_context)
+                return answer_result(answer, sources_used)
+
+            except Exception as e:
+                if not should_retry_answer(e, attempt):
+                    return dict(TOO_LARGE_RESULT)
+                optimized_context = await asyncio.to_thread(shrink_context, optimized_context)
+
+    except Exception as e:
+        print(f"Error in aanswer_question_with_sources: {e}")
+        return error_result(e)
 
 # Enhanced legacy function signature that now returns clean text sources
 def answer_question_legacy_with_sources(question: str, relevant_docs: List[Document]) -> Dict[str, Any]:
@@ -469,4 +500,102 @@ def answer_question_legacy(question: str, relevant_docs: List[Document]) -> str:
     """Backward compatible legacy function that returns only the answer"""
     result = answer_question_legacy_with_sources(question, relevant_docs)
     print(result)
-    return result
\ No newline at end of file
+    return result
+
+def build_legacy_context(question: str, relevant_docs: List[Document]) -> str:
+    """Chunk the documents (decoding any images) and fit them into one context string."""
+    processed_chunks, sources_text = preprocess_documents_with_chunking_and_sources(relevant_docs)
+    enhanced_context, _ = create_optimized_context_with_sources(processed_chunks, sources_text, question)
+    return enhanced_context
+
+async def aanswer_question_legacy_with_sources(question: str, relevant_docs: List[Document]) -> Dict[str, Any]:
+    """Async variant of answer_question_legacy_with_sources"""
+    enhanced_context = await asyncio.to_thread(build_legacy_context, question, relevant_docs)
+    return await aanswer_question_with_sources(question, enhanced_context, relevant_docs)
+
+async def aanswer_question_legacy(question: str, relevant_docs: List[Document]) -> str:
+    """Async variant of answer_question_legacy"""
+    result = await aanswer_question_legacy_with_sources(question, relevant_docs)
+    print(result)
+    return result
+
+
+async def astream_answer_question_legacy(question: str, relevant_docs: List[Document]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of answer_question_legacy yielding (event, data) pairs:
+    one 'sources' event, then 'token' events as the model generates, then 'usage' (or 'error').
+
+    Rate limited requests are retried with a smaller context as long as no token has been sent yet.
+    """
+    started = time.perf_counter()
+    # Chunking, image decoding and token counting run in a worker thread; only the LLM stream stays on the loop
+    enhanced_context = await asyncio.to_thread(build_legacy_context, question, relevant_docs)
+    optimized_context, sources_used = await asyncio.to_thread(prepare_answer_context, question, enhanced_context, relevant_docs)
+
+    yield "sources", {'sources': sources_used, 'total_sources': len(sources_used)}
+
+    llm = get_llm()
+    for attempt in range(QA_MAX_RETRIES):
+        formatted_prompt, prompt_tokens = await asyncio.to_thread(build_answer_prompt, question, optimized_context)
+        reserved_tokens = prompt_tokens + QA_MAX_OUTPUT_TOKENS
+        is_groq = isinstance(llm, ChatGroq)
+        answer_parts = []
+        first_token_at = None
+        reported_usage = None
+        try:
+            if is_groq:
+                await rate_limiter.areserve(QA_MODEL_NAME, reserved_tokens)
+            if hasattr(llm, 'astream'):
+                async for chunk in llm.astream(formatted_prompt):
+                    # Groq reports the request's usage on the final (usually empty) chunk
+                    if getattr(chunk, 'usage_metadata', None):
+                        reported_usage = chunk.usage_metadata
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if not text:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    answer_parts.append(text)
+                    yield "token", text
+            else:
+                response = await llm.ainvoke(formatted_prompt)
+                reported_usage = getattr(response, 'usage_metadata', None)
+                text = response.content if hasattr(response, 'content') else str(response)
+                first_token_at = time.perf_counter()
+                answer_parts.append(text)
+                yield "token", text
+        except Exception as e:
+            if not answer_parts:
+                try:
+                    retry = should_retry_answer(e, attempt)
+                except Exception:
+                    retry = False
+                if retry:
+                    optimized_context = await asyncio.to_thread(shrink_context, optimized_context)
+                    continue
+            print(f"Error in astream_answer_question_legacy: {e}")
+            yield "error", {'detail': str(e)}
+            return
+
+        if reported_usage:
+            prompt_tokens = reported_usage.get('input_tokens', prompt_tokens)
+            completion_tokens = reported_usage.get('output_tokens', 0)
+        else:
+            # No usage from the provider (e.g. Ollama): fall back to local tiktoken counts
+            completion_tokens = await asyncio.to_thread(count_tokens, "".join(answer_parts))
+        if is_groq:
+            # Hand the unused part of the output reservation back to the shared budget
+            rate_limiter.settle(QA_MODEL_NAME, reserved_tokens, prompt_tokens + completion_tokens)
+        finished = time.perf_counter()
+        yield "usage", {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'estimated': not reported_usage,
+            'attempts': attempt + 1,
+            'time_to_first_token_ms': round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            'total_time_ms': round((finished - started) * 1000, 1)
+        }
+        return
+
+    yield "error", {'detail': TOO_LARGE_RESULT['answer']}
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from filelock import FileLock
+
+# Per-model Groq quotas: requests per minute and tokens per minute
+GROQ_MODEL_LIMITS = {
+    "llama3-70b-8192": {"rpm": 30, "tpm": 6000},
+    "meta-llama/llama-4-maverick-17b-128e-instruct": {"rpm": 30, "tpm": 6000},
+}
+DEFAULT_MODEL_LIMITS = {"rpm": 30, "tpm": 6000}
+# Optional JSON override, e.g. {"llama3-70b-8192": {"rpm": 100, "tpm": 30000}}
+GROQ_MODEL_LIMITS.update(json.loads(os.getenv("GROQ_RATE_LIMITS", "{}")))
+# Directory shared by all workers on a host; empty keeps the budget per process
+GROQ_RATE_LIMIT_STATE_DIR = os.getenv("GROQ_RATE_LIMIT_STATE_DIR", "")
+RATE_LIMIT_MARKERS = ("rate_limit_exceeded", "rate limit reached", "too many requests")
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # groq.RateLimitError carries the HTTP status; a bare "429" in a message (an id, a token count) does not
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in RATE_LIMIT_MARKERS)
+
+def _refill(state: dict, limits: dict, now: float) -> dict:
+    elapsed = max(0.0, now - state["updated"])
+    return {
+        "requests": min(limits["rpm"], state["requests"] + elapsed * limits["rpm"] / 60),
+        "tokens": min(limits["tpm"], state["tokens"] + elapsed * limits["tpm"] / 60),
+        "updated": now,
+    }
+
+def _take(state: dict, limits: dict, requests: int, tokens: int, now: float):
+    """Refill the buckets and take from them if both have room. Returns (state, seconds to wait)."""
+    state = _refill(state, limits, now)
+    # A single reservation can never need more than a full bucket
+    requests = min(requests, limits["rpm"])
+    tokens = min(tokens, limits["tpm"])
+
+    request_wait = max(0.0, (requests - state["requests"]) * 60 / limits["rpm"])
+    token_wait = max(0.0, (tokens - state["tokens"]) * 60 / limits["tpm"])
+    wait = max(request_wait, token_wait)
+    if wait == 0:
+        state["requests"] -= requests
+        state["tokens"] -= tokens
+    return state, wait
+
+class GroqRateLimiter:
+    """Token buckets for requests/min and tokens/min per Groq model.
+
+    Callers reserve an estimated token cost before sending a request and wait here instead of
+    running into a 429. With GROQ_RATE_LIMIT_STATE_DIR set, bucket state lives in files guarded
+    by a file lock, so every worker on the host draws from the same budget.
+    """
+
+    def __init__(self, state_dir: str = GROQ_RATE_LIMIT_STATE_DIR):
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._states = {}
+        self._counters = {}
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    @staticmethod
+    def limits_for(model: str) -> dict:
+        return GROQ_MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)
+
+    def _counter(self, model: str) -> dict:
+        return self._counters.setdefault(model, {"reservations": 0, "waits": 0, "wait_seconds": 0.0, "rate_limited": 0})
+
+    def _state_path(self, model: str) -> str:
+        safe_name = "".join(c if c.isalnum() else "_" for c in model)
+        return os.path.join(self.state_dir, f"{safe_name}.json")
+
+    def _update(self, model: str, change):
+        """Apply ``change(state, limits, now) -> (state, result)`` atomically and return the result."""
+        limits = self.limits_for(model)
+        now = time.time()
+
+        if not self.state_dir:
+            with self._lock:
+                state = self._states.get(model) or {"requests": limits["rpm"], "tokens": limits["tpm"], "updated": now}
+                state, result = change(state, limits, now)
+                self._states[model] = state
+                return result
+
+        path = self._state_path(model)
+        with FileLock(path + ".lock"):
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                state = {"requests": limits["rpm"], "tokens": limits["tpm"], "updated": now}
+            state, result = change(state, limits, now)
+            with open(path, "w") as f:
+                json.dump(state, f)
+            return result
+
+    def _try_reserve(self, model: str, tokens: int, requests: int) -> float:
+        return self._update(model, lambda state, limits, now: _take(state, limits, requests, tokens, now))
+
+    def _record(self, model: str, waited: float) -> None:
+        with self._lock:
+            counter = self._counter(model)
+            counter["reservations"] += 1
+            if waited > 0:
+                counter["waits"] += 1
+                counter["wait_seconds"] += waited
+
+    def reserve(self, model: str, tokens: int, requests: int = 1) -> float:
+        """Block until ``requests`` calls costing ``tokens`` fit in the model's budget. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._try_reserve(model, tokens, requests)
+            if wait == 0:
+                break
+            print(f"Rate limiter: waiting {wait:.1f}s for {model} ({tokens} tokens)")
+            time.sleep(wait)
+            waited += wait
+        self._record(model, waited)
+        return waited
+
+    async def areserve(self, model: str, tokens: int, requests: int = 1) -> float:
+        """Async variant of reserve() that waits with asyncio.sleep."""
+        waited = 0.0
+        while True:
+            if self.state_dir:
+                wait = await asyncio.to_thread(self._try_reserve, model, tokens, requests)
+            else:
+                wait = self._try_reserve(model, tokens, requests)
+            if wait == 0:
+                break
+            print(f"Rate limiter: waiting {wait:.1f}s for {model} ({tokens} tokens)")
+            await asyncio.sleep(wait)
+            waited += wait
+        self._record(model, waited)
+        return waited
+
+    def settle(self, model: str, reserved_tokens: int, actual_tokens: int) -> None:
+        """Return over-estimated tokens to the bucket, or charge the shortfall."""
+        difference = reserved_tokens - actual_tokens
+        if difference == 0:
+            return
+
+        def change(state, limits, now):
+            state = _refill(state, limits, now)
+            state["tokens"] = min(limits["tpm"], state["tokens"] + difference)
+            return state, None
+        self._update(model, change)
+
+    def penalize(self, model: str) -> None:
+        """Empty the model's buckets after a 429 so every caller backs off, not just the one that failed."""
+        with self._lock:
+            self._counter(model)["rate_limited"] += 1
+
+        def change(state, limits, now):
+            return {"requests": 0.0, "tokens": 0.0, "updated": now}, None
+        self._update(model, change)
+
+    def utilisation(self) -> dict:
+        """Current budget use per model, 0.0 meaning idle and 1.0 meaning exhausted."""
+        with self._lock:
+            models = set(self._states) | set(self._counters)
+            counters = {model: dict(self._counter(model)) for model in models}
+
+        report = {}
+        for model in models:
+            state = self._update(model, lambda state, limits, now: (_refill(state, limits, now), _refill(state, limits, now)))
+            limits = self.limits_for(model)
+            report[model] = {
+                "rpm_limit": limits["rpm"],
+                "tpm_limit": limits["tpm"],
+                "requests_available": round(state["requests"], 2),
+                "tokens_available": round(state["tokens"], 1),
+                "request_utilisation": round(1 - state["requests"] / limits["rpm"], 3),
+                "token_utilisation": round(1 - state["tokens"] / limits["tpm"], 3),
+                **counters[model],
+            }
+        return report
+
+# Process-wide limiter shared by every Groq caller
+rate_limiter = GroqRateLimiter()
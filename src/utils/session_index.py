@@ -0,0 +1,313 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+from filelock import FileLock
+from langchain_community.vectorstores import Chroma
+from langchain.storage import InMemoryStore, LocalFileStore, create_kv_docstore
+from langchain.retrievers.multi_vector import MultiVectorRetriever
+from src.utils.embeddings import get_embedding_model
+
+# Empty SESSION_PERSIST_DIR keeps sessions in process memory only
+SESSION_PERSIST_DIR = os.getenv("SESSION_PERSIST_DIR", os.path.join("data", "sessions"))
+SESSION_DISK_TTL_SECONDS = float(os.getenv("SESSION_DISK_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_PRUNE_INTERVAL = 3600  # Seconds between sweeps of expired sessions on disk
+SESSION_TOUCH_INTERVAL = 60  # Seconds between last-access updates on disk for a warm session
+SESSION_MAX_GENERATIONS = 3  # Collections kept per rebuilt session: the current one and those it replaced
+# A replaced collection is deleted this long after the swap; workers notice a swap within SESSION_TOUCH_INTERVAL
+SESSION_GENERATION_GRACE_SECONDS = 10 * SESSION_TOUCH_INTERVAL
+BUILD_LOCK_FILE = ".build.lock"
+SESSION_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+META_FILE = "session.json"
+EMBEDDING_BYTES_PER_VECTOR = 384 * 4 * 2  # MiniLM float32 vectors plus index overhead
+CHROMA_DIR = "chroma"  # One Chroma database under SESSION_PERSIST_DIR holds every session's collection
+# Vector indexes Chroma keeps loaded; least recently queried collections are unloaded beyond this
+SESSION_CHROMA_MEMORY_BYTES = int(os.getenv("SESSION_CHROMA_MEMORY_BYTES", os.getenv("SESSION_MAX_BYTES", str(512 * 1024 * 1024))))
+ID_KEY = "doc_id"
+
+KIND_MULTI_VECTOR = "multi_vector"  # Document and image sessions: Chroma + docstore
+KIND_VECTORSTORE = "vectorstore"  # Plain Chroma retriever, e.g. sumTube summaries
+
+def session_path(key: Optional[str]) -> Optional[str]:
+    """Directory for a persisted session, or None when persistence is off or the key is unsafe."""
+    if not SESSION_PERSIST_DIR or not key or not SESSION_KEY_PATTERN.match(key):
+        return None
+    return os.path.join(SESSION_PERSIST_DIR, key)
+
+_build_locks = [threading.Lock() for _ in range(64)]  # Striped by key when there is no disk to lock on
+_client = None
+_client_lock = threading.Lock()
+
+def get_session_client():
+    """Process-wide Chroma client for persisted sessions.
+
+    Chroma keeps one System per database path for the life of the process, so sessions are
+    collections in a single shared database rather than databases of their own. Opening another
+    session then costs a collection handle, and Chroma's LRU segment cache unloads the indexes of
+    sessions nobody queries instead of every session ever opened staying resident.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import chromadb
+                from chromadb.config import Settings
+                _client = chromadb.PersistentClient(
+                    path=os.path.join(SESSION_PERSIST_DIR, CHROMA_DIR),
+                    settings=Settings(
+                        chroma_segment_cache_policy="LRU",
+                        chroma_memory_limit_bytes=SESSION_CHROMA_MEMORY_BYTES
+                    )
+                )
+    return _client
+
+def _session_vectorstore(collection_name: str) -> Chroma:
+    return Chroma(
+        collection_name=collection_name,
+        embedding_function=get_embedding_model(),
+        client=get_session_client()
+    )
+
+def _delete_collection(collection_name: str) -> None:
+    try:
+        get_session_client().delete_collection(collection_name)
+    except Exception as e:
+        print(f"Error deleting collection {collection_name}: {e}")
+
+def collection_name_for(key: str, generation: Optional[str] = None) -> str:
+    # Chroma names must start and end with an alphanumeric character
+    return f"session_{key}_{generation}_idx" if generation else f"session_{key}_idx"
+
+def session_build_lock(key: str):
+    """Lock held while a shared session (a sumTube video) is built; a file lock across workers when persisted.
+
+    The lock file lives in the session directory, so pruning the session removes it too.
+    """
+    path = session_path(key)
+    if path:
+        os.makedirs(path, exist_ok=True)
+        return FileLock(os.path.join(path, BUILD_LOCK_FILE))
+    return _build_locks[hash(key) % len(_build_locks)]
+
+def _dump_meta(path: str, meta: dict) -> None:
+    # Written atomically: a reader sees the previous collection or the new one, never half a file
+    os.makedirs(path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+def _write_meta(path: str, kind: str, collection_name: str, search_kwargs: dict, **extra) -> None:
+    meta = {
+        "kind": kind,
+        "collection_name": collection_name,
+        "search_kwargs": search_kwargs,
+        "created_at": time.time()
+    }
+    meta.update((name, value) for name, value in extra.items() if value is not None)
+    _dump_meta(path, meta)
+
+def _read_meta(path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def read_session_meta(key: Optional[str]) -> Optional[dict]:
+    """What a persisted session was built from: its collection, source digest and build time."""
+    path = session_path(key)
+    return _read_meta(path) if path else None
+
+def read_session_size(key: Optional[str]) -> Optional[int]:
+    """Size estimate recorded when the session was built, so reopening it needs no collection scan."""
+    path = session_path(key)
+    meta = _read_meta(path) if path else None
+    return meta.get("nbytes") if meta else None
+
+def record_session_size(key: str, nbytes: int) -> None:
+    """Add the size estimate to a session built before its contents were known (document sessions)."""
+    path = session_path(key)
+    meta = _read_meta(path) if path else None
+    if meta is not None and "nbytes" not in meta:
+        meta["nbytes"] = nbytes
+        _dump_meta(path, meta)
+
+def build_multi_vector_retriever(key: str) -> MultiVectorRetriever:
+    """Create an empty multi-vector retriever for ``key``, on disk when persistence is enabled."""
+    collection_name = collection_name_for(key)
+    path = session_path(key)
+
+    if path:
+        _write_meta(path, KIND_MULTI_VECTOR, collection_name, {})
+        vectorstore = _session_vectorstore(collection_name)
+        docstore = create_kv_docstore(LocalFileStore(os.path.join(path, "docstore")))
+    else:
+        vectorstore = Chroma(collection_name=collection_name, embedding_function=get_embedding_model())
+        docstore = InMemoryStore()
+
+    return MultiVectorRetriever(vectorstore=vectorstore, docstore=docstore, id_key=ID_KEY)
+
+def _split_superseded(superseded: List[dict], now: float) -> Tuple[List[dict], List[dict]]:
+    """Replaced collections to keep (still in their grace period, newest allowed by the cap) and to delete."""
+    in_grace = [entry for entry in superseded if now - entry["at"] < SESSION_GENERATION_GRACE_SECONDS]
+    keep = in_grace[-(SESSION_MAX_GENERATIONS - 1):] if SESSION_MAX_GENERATIONS > 1 else []
+    return keep, [entry for entry in superseded if entry not in keep]
+
+def build_vectorstore(key: str, search_kwargs: dict, documents: List, source_digest: Optional[str] = None) -> Chroma:
+    """Index ``documents`` into a new plain vector store for ``key``, on disk when persistence is enabled.
+
+    Every build fills a collection of its own and only then points the session at it, so queries
+    still running against an earlier build are not disturbed. The replaced collection is kept
+    for SESSION_GENERATION_GRACE_SECONDS, and never more than SESSION_MAX_GENERATIONS per
+    session, then deleted. Call it under ``session_build_lock(key)``.
+    """
+    collection_name = collection_name_for(key, uuid.uuid4().hex[:8])
+    path = session_path(key)
+
+    if path:
+        vectorstore = _session_vectorstore(collection_name)
+    else:
+        vectorstore = Chroma(collection_name=collection_name, embedding_function=get_embedding_model())
+    if documents:
+        vectorstore.add_documents(documents)
+    if path:
+        previous = _read_meta(path)
+        superseded = []
+        if previous is not None:
+            superseded = previous.get("superseded", []) + [{"collection_name": previous["collection_name"], "at": time.time()}]
+        keep, expired = _split_superseded(superseded, time.time())
+        # Plain vector stores keep the chunk text inside Chroma
+        nbytes = sum(len(doc.page_content) + EMBEDDING_BYTES_PER_VECTOR for doc in documents)
+        _write_meta(
+            path, KIND_VECTORSTORE, collection_name, search_kwargs,
+            nbytes=nbytes, source_digest=source_digest, superseded=keep
+        )
+        for entry in expired:
+            _delete_collection(entry["collection_name"])
+    return vectorstore
+
+def is_persisted(key: Optional[str]) -> bool:
+    path = session_path(key)
+    return bool(path) and os.path.exists(os.path.join(path, META_FILE))
+
+def open_session_index(key: Optional[str]):
+    """Reopen a persisted session written by any worker. Vectors stay on disk until queried."""
+    path = session_path(key)
+    if not path:
+        return None
+
+    meta = _read_meta(path)
+    if meta is None:
+        return None
+    try:
+        # Chroma would otherwise create an empty collection for a session pruned from the database
+        get_session_client().get_collection(meta["collection_name"])
+    except Exception:
+        print(f"Persisted session {key} has no collection, ignoring it")
+        return None
+
+    vectorstore = _session_vectorstore(meta["collection_name"])
+    touch_session_index(key)
+    print(f"Opened persisted session {key}")
+
+    if meta["kind"] == KIND_MULTI_VECTOR:
+        docstore = create_kv_docstore(LocalFileStore(os.path.join(path, "docstore")))
+        return MultiVectorRetriever(vectorstore=vectorstore, docstore=docstore, id_key=ID_KEY)
+    return vectorstore.as_retriever(search_kwargs=meta.get("search_kwargs") or {})
+
+def touch_session_index(key: str) -> Optional[str]:
+    """Record an access so disk pruning keeps sessions that are still in use.
+
+    Returns the session's current collection name, so a worker can tell that another one rebuilt it.
+    """
+    path = session_path(key)
+    if not path:
+        return None
+    try:
+        os.utime(os.path.join(path, META_FILE))
+    except OSError:
+        pass
+    meta = _read_meta(path)
+    return meta["collection_name"] if meta else None
+
+def delete_session_index(key: str) -> None:
+    """Delete a persisted session: its collection in the shared database, then its directory.
+
+    Only pruning calls this, for sessions no worker has opened within the disk TTL.
+    """
+    path = session_path(key)
+    if not path:
+        return
+    meta = _read_meta(path)
+    if meta is not None:
+        for entry in meta.get("superseded", []):
+            _delete_collection(entry["collection_name"])
+        _delete_collection(meta["collection_name"])
+    shutil.rmtree(path, ignore_errors=True)
+
+def expire_superseded_collections(key: str) -> int:
+    """Delete collections replaced by a rebuild once their grace period is over."""
+    path = session_path(key)
+    meta = _read_meta(path) if path else None
+    if not meta or not meta.get("superseded"):
+        return 0
+    with session_build_lock(key):
+        meta = _read_meta(path)
+        if not meta:
+            return 0
+        keep, expired = _split_superseded(meta.get("superseded", []), time.time())
+        if expired:
+            meta["superseded"] = keep
+            _dump_meta(path, meta)
+    for entry in expired:
+        _delete_collection(entry["collection_name"])
+    return len(expired)
+
+def prune_session_indexes(max_age_seconds: float = SESSION_DISK_TTL_SECONDS) -> int:
+    """Delete persisted sessions that no worker has opened within ``max_age_seconds``.
+
+    Live sessions lose the collections a rebuild replaced; directories left without a session
+    by a failed build are removed once they are as old as the TTL.
+    """
+    if not SESSION_PERSIST_DIR or not os.path.isdir(SESSION_PERSIST_DIR):
+        return 0
+
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for key in os.listdir(SESSION_PERSIST_DIR):
+        if key == CHROMA_DIR:
+            continue
+        path = os.path.join(SESSION_PERSIST_DIR, key)
+        try:
+            if os.path.exists(os.path.join(path, META_FILE)):
+                if os.path.getmtime(os.path.join(path, META_FILE)) < cutoff:
+                    delete_session_index(key)
+                    removed += 1
+                else:
+                    expire_superseded_collections(key)
+            elif os.path.getmtime(path) < cutoff:
+                # Also build lock files that earlier versions kept next to the session directories
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+        except OSError:
+            continue
+    if removed:
+        print(f"Pruned {removed} persisted sessions")
+    return removed
+
+def prune_session_indexes_periodically(interval: float = SESSION_PRUNE_INTERVAL) -> None:
+    """Prune expired sessions now and then every ``interval`` seconds; run in a daemon thread."""
+    while True:
+        try:
+            prune_session_indexes()
+        except Exception as e:
+            print(f"Session pruning failed: {e}")
+        time.sleep(interval)
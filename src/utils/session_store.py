@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from src.utils.session_index import (
+    EMBEDDING_BYTES_PER_VECTOR,
+    SESSION_TOUCH_INTERVAL,
+    is_persisted,
+    open_session_index,
+    read_session_size,
+    record_session_size,
+    touch_session_index,
+)
+
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(512 * 1024 * 1024)))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+EXPIRED_KEYS_REMEMBERED = 10000  # Evicted keys kept so /query can say "expired" rather than "not found"
+
+def estimate_retriever_bytes(retriever) -> int:
+    """Rough memory footprint of a retriever: docstore payloads plus its vectors."""
+    total = 0
+
+    docstore = getattr(retriever, "docstore", None)
+    store = getattr(docstore, "store", None)
+    if isinstance(store, dict):
+        for doc in store.values():
+            total += len(getattr(doc, "page_content", "") or "") + len(str(getattr(doc, "metadata", {})))
+
+    vectorstore = getattr(retriever, "vectorstore", None)
+    collection = getattr(vectorstore, "_collection", None)
+    if collection is not None:
+        try:
+            count = collection.count()
+            total += count * EMBEDDING_BYTES_PER_VECTOR
+            if docstore is None:
+                # Plain vector store retrievers keep the chunk text inside Chroma
+                documents = collection.get(include=["documents"]).get("documents") or []
+                total += sum(len(doc or "") for doc in documents)
+        except Exception as e:
+            print(f"Could not size collection: {e}")
+    return total
+
+def collection_name_of(retriever) -> Optional[str]:
+    collection = getattr(getattr(retriever, "vectorstore", None), "_collection", None)
+    return getattr(collection, "name", None)
+
+def delete_retriever_collection(retriever) -> None:
+    """Drop the Chroma collection behind a retriever so its memory is released."""
+    vectorstore = getattr(retriever, "vectorstore", None)
+    if vectorstore is None or not hasattr(vectorstore, "delete_collection"):
+        return
+    try:
+        vectorstore.delete_collection()
+    except Exception as e:
+        print(f"Error deleting collection: {e}")
+
+class SessionEntry:
+    def __init__(self, key: str, retriever, nbytes: int, owns_collection: bool, persisted: bool):
+        self.key = key
+        self.retriever = retriever
+        self.nbytes = nbytes
+        self.owns_collection = owns_collection
+        self.persisted = persisted
+        self.collection_name = collection_name_of(retriever)
+        self.created_at = time.monotonic()
+        self.last_access = self.created_at
+        self.last_touch = self.created_at
+
+class SessionStore:
+    """Retrievers keyed by session or video id, bounded by entry count, estimated bytes and idle TTL.
+
+    Entries are kept in least-recently-used order, so idle entries are always at the front and
+    both TTL expiry and LRU eviction pop from there. Evicted entries have their Chroma collection
+    deleted when the session owns it.
+
+    Sessions persisted under SESSION_PERSIST_DIR are only dropped from memory on eviction; their
+    collections live in the shared session database, whose cache unloads indexes nobody queries.
+    A lookup that misses in memory reopens them from disk, so any worker can serve a session
+    another worker created.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        max_bytes: int = SESSION_MAX_BYTES,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._expired_keys = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._cold_opens = 0
+        self._evictions = {"ttl": 0, "entries": 0, "bytes": 0, "replaced": 0}
+
+    def put(
+        self,
+        key: str,
+        retriever,
+        nbytes: Optional[int] = None,
+        owns_collection: bool = True,
+        persisted: Optional[bool] = None,
+    ) -> None:
+        if persisted is None:
+            persisted = is_persisted(key)
+        if nbytes is None and persisted:
+            # Recorded at build time; a cold open must not scan the collection
+            nbytes = read_session_size(key)
+        if nbytes is None:
+            nbytes = estimate_retriever_bytes(retriever)
+            if persisted:
+                record_session_size(key, nbytes)
+
+        with self._lock:
+            victims = []
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+                self._evictions["replaced"] += 1
+                # A persisted collection outlives its entry, so only in-memory ones are released
+                if previous.retriever is not retriever and not previous.persisted:
+                    victims.append(previous)
+
+            self._entries[key] = SessionEntry(key, retriever, nbytes, owns_collection, persisted)
+            self._bytes += nbytes
+            self._expired_keys.pop(key, None)
+            victims.extend(self._evict_locked(keep=key))
+
+        self._release(victims)
+
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        """Return the retriever for ``key`` and mark it recently used, or None."""
+        victims = []
+        touch = False
+        with self._lock:
+            victims.extend(self._expire_locked())
+            entry = self._entries.get(key) if key else None
+            if entry is not None:
+                self._hits += 1
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(key)
+                if entry.persisted and entry.last_access - entry.last_touch >= SESSION_TOUCH_INTERVAL:
+                    entry.last_touch = entry.last_access
+                    touch = True
+
+        self._release(victims)
+        if entry is not None:
+            current = touch_session_index(key) if touch else None
+            if current is None or current == entry.collection_name:
+                return entry.retriever
+            # Another worker rebuilt the session (a new sumTube summary): reopen its new collection
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._bytes -= entry.nbytes
+
+        # Not in memory: another worker or an earlier process may have persisted it
+        retriever = open_session_index(key)
+        with self._lock:
+            if retriever is None:
+                self._misses += 1
+                return None
+            self._cold_opens += 1
+        self.put(key, retriever, persisted=True)
+        return retriever
+
+    def is_expired(self, key: Optional[str]) -> bool:
+        """Whether ``key`` named a session that has since been evicted."""
+        with self._lock:
+            return bool(key) and key in self._expired_keys
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+        if entry is not None:
+            self._release([entry])
+
+    def stats(self) -> dict:
+        victims = []
+        with self._lock:
+            victims.extend(self._expire_locked())
+            lookups = self._hits + self._misses
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "cold_opens": self._cold_opens,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": dict(self._evictions),
+            }
+        self._release(victims)
+        return stats
+
+    def _pop_oldest_locked(self, reason: str) -> SessionEntry:
+        key, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.nbytes
+        self._evictions[reason] += 1
+        self._expired_keys[key] = True
+        while len(self._expired_keys) > EXPIRED_KEYS_REMEMBERED:
+            self._expired_keys.popitem(last=False)
+        return entry
+
+    def _expire_locked(self) -> list:
+        victims = []
+        now = time.monotonic()
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if now - oldest.last_access < self.ttl_seconds:
+                break
+            victims.append(self._pop_oldest_locked("ttl"))
+        return victims
+
+    def _evict_locked(self, keep: str) -> list:
+        victims = self._expire_locked()
+        while len(self._entries) > self.max_entries and next(iter(self._entries)) != keep:
+            victims.append(self._pop_oldest_locked("entries"))
+        while self._bytes > self.max_bytes and next(iter(self._entries)) != keep:
+            victims.append(self._pop_oldest_locked("bytes"))
+        return victims
+
+    @staticmethod
+    def _release(entries: list) -> None:
+        # Closing and deleting collections happens outside the lock so lookups are not held up
+        for entry in entries:
+            # Persisted sessions stay on disk and another worker may be reading them; the shared
+            # client unloads their index once other sessions need the memory
+            if not entry.persisted and entry.owns_collection:
+                delete_retriever_collection(entry.retriever)
@@ -0,0 +1,25 @@
+import os
+from typing import List, Optional, Tuple
+from src.utils.disk_cache import DiskCache
+
+SUMMARY_CACHE_DIR = os.getenv("SUMMARY_CACHE_DIR", os.path.join("data", "summary_cache"))
+SUMMARY_CACHE_MAX_BYTES = int(os.getenv("SUMMARY_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# One summary per (prompt template, model, temperature, chunk), shared by both summary modes and every upload
+_cache = DiskCache(SUMMARY_CACHE_DIR, SUMMARY_CACHE_MAX_BYTES, name="summary-cache")
+
+def summary_key(prompt_template: str, model_name: str, temperature: float, content: str) -> str:
+    return DiskCache.make_key("summary", prompt_template, model_name, temperature, content)
+
+def lookup_summaries(elements: List[str], prompt_template: str, model_name: str, temperature: float) -> Tuple[List[str], List[Optional[str]]]:
+    """Cache keys for the chunks and their cached summaries, None where the chunk still needs the LLM."""
+    keys = [summary_key(prompt_template, model_name, temperature, content) for content in elements]
+    return keys, [_cache.get(key) for key in keys]
+
+def store_summaries(keys: List[str], summaries: List[str]) -> None:
+    for key, summary in zip(keys, summaries):
+        if summary:
+            _cache.set(key, summary)
+
+def summary_cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,147 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import tiktoken
+
+ENCODER = tiktoken.encoding_for_model("gpt-4")  # Close enough for Groq models' token counts
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+TOKEN_COUNT_MIN_CHARS = 64  # Shorter strings are cheaper to encode than to look up
+WHITESPACE_BYTES = frozenset(b" \t\n\r\f\v")
+
+class TokenCounter:
+    """Token counts memoized by string hash in a bounded least-recently-used map.
+
+    The same context strings are counted several times while one answer or summary is prepared;
+    only the first count encodes them. Counters report how many characters went through the
+    encoder and how many were answered from the memo instead.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_COUNT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._hits = 0
+        self._encoded_chars = 0
+        self._avoided_chars = 0
+
+    @staticmethod
+    def _key(text: str) -> tuple:
+        return hash(text), len(text)
+
+    def count(self, text: str) -> int:
+        if len(text) < TOKEN_COUNT_MIN_CHARS:
+            with self._lock:
+                self._calls += 1
+                self._encoded_chars += len(text)
+            return len(ENCODER.encode(text))
+
+        key = self._key(text)
+        with self._lock:
+            self._calls += 1
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                self._hits += 1
+                self._avoided_chars += len(text)
+                return count
+
+        count = len(ENCODER.encode(text))
+        with self._lock:
+            self._encoded_chars += len(text)
+        self.remember(text, count)
+        return count
+
+    def remember(self, text: str, count: int) -> None:
+        """Record a count from encoding exactly this text, e.g. while splitting it.
+
+        Sums of part counts are not exact for the joined string and must not be recorded here.
+        """
+        if len(text) < TOKEN_COUNT_MIN_CHARS:
+            return
+        with self._lock:
+            self._counts[self._key(text)] = count
+            self._counts.move_to_end(self._key(text))
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._counts),
+                "max_entries": self.max_entries,
+                "calls": self._calls,
+                "hits": self._hits,
+                "hit_rate": round(self._hits / self._calls, 4) if self._calls else 0.0,
+                "encoded_chars": self._encoded_chars,
+                "avoided_chars": self._avoided_chars,
+            }
+
+# Process-wide counter shared by the summarizers and question answering
+_counter = TokenCounter()
+
+def count_tokens(text: str) -> int:
+    return _counter.count(text)
+
+def tokenizer_stats() -> dict:
+    return _counter.stats()
+
+def _is_char_start(data: bytes, position: int) -> bool:
+    # UTF-8 continuation bytes look like 0b10xxxxxx
+    return position >= len(data) or data[position] & 0xC0 != 0x80
+
+def _cut_point(data: bytes, tokens: List[int], start: int, end: int, end_position: int) -> Tuple[int, int]:
+    """Latest token index in (start, end] that begins a word, with its byte position in ``data``.
+
+    Walks back from ``end`` one token at a time, so only the tokens near the cut are looked at.
+    A span that is one long word is cut at the latest token that begins a character, so a
+    multi-byte character is never split across two pieces.
+    """
+    fallback = None
+    index, position = end, end_position
+    while index > start:
+        if data[position] in WHITESPACE_BYTES or data[position - 1] in WHITESPACE_BYTES:
+            return index, position
+        if fallback is None and _is_char_start(data, position):
+            fallback = (index, position)
+        index -= 1
+        position -= len(ENCODER.decode_single_token_bytes(tokens[index]))
+    return fallback or (end, end_position)
+
+def _split(text: str, max_tokens: int, max_pieces: Optional[int] = None) -> List[str]:
+    if not text or not text.strip():
+        return []
+    max_tokens = max(1, int(max_tokens))
+    tokens = ENCODER.encode(text)
+    _counter.remember(text, len(tokens))
+    if len(tokens) <= max_tokens:
+        return [text.strip()]
+
+    # Token bytes concatenate back to the UTF-8 text, so byte lengths of token runs give offsets
+    data = text.encode("utf-8")
+    pieces = []
+    start, position = 0, 0
+    while start < len(tokens) and (max_pieces is None or len(pieces) < max_pieces):
+        end = min(start + max_tokens, len(tokens))
+        end_position = position + len(ENCODER.decode_bytes(tokens[start:end]))
+        if end < len(tokens):
+            end, end_position = _cut_point(data, tokens, start, end, end_position)
+        piece = data[position:end_position].decode("utf-8", errors="ignore").strip()
+        if piece:
+            pieces.append(piece)
+        start, position = end, end_position
+    return pieces
+
+def split_on_tokens(text: str, max_tokens: int) -> List[str]:
+    """Split text into pieces of at most ``max_tokens`` tokens, cutting between words where possible.
+
+    The text is encoded once and cut on token byte offsets, so the cost is linear in its length
+    rather than one encoder call per word.
+    """
+    return _split(text, max_tokens)
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest word-aligned prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    pieces = _split(text, max_tokens, max_pieces=1)
+    return pieces[0] if pieces else ""
@@ -0,0 +1,41 @@
+import os
+from typing import List, Optional, Tuple
+from src.utils.disk_cache import DiskCache
+
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join("data", "transcript_cache"))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+TRANSCRIPT_CACHE_TTL_SECONDS = float(os.getenv("TRANSCRIPT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+TRANSCRIPT_NEGATIVE_TTL_SECONDS = float(os.getenv("TRANSCRIPT_NEGATIVE_TTL_SECONDS", str(6 * 3600)))  # "No transcript" is rechecked after this long
+
+# Transcripts are shared by every user who summarizes the same video; "no transcript" answers
+# live in their own, shorter-lived cache so captions added later are picked up
+_cache = DiskCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_BYTES, TRANSCRIPT_CACHE_TTL_SECONDS, name="transcript-cache")
+_missing = DiskCache(
+    os.path.join(TRANSCRIPT_CACHE_DIR, "missing"),
+    TRANSCRIPT_CACHE_MAX_BYTES // 16,
+    TRANSCRIPT_NEGATIVE_TTL_SECONDS,
+    name="transcript-negative-cache"
+)
+
+def transcript_key(provider: str, video_id: str, lang: str) -> str:
+    return DiskCache.make_key("transcript", provider, video_id, lang)
+
+def get_cached_transcript(provider: str, video_id: str, lang: str) -> Optional[Tuple[Optional[List[str]], Optional[str]]]:
+    """(segments, None) or (None, error) from an earlier fetch of this video, None when it was never fetched."""
+    key = transcript_key(provider, video_id, lang)
+    segments = _cache.get(key)
+    if segments is not None:
+        return segments, None
+    error = _missing.get(key)
+    if error is not None:
+        return None, error
+    return None
+
+def cache_transcript(provider: str, video_id: str, lang: str, segments: List[str]) -> None:
+    _cache.set(transcript_key(provider, video_id, lang), segments)
+
+def cache_missing_transcript(provider: str, video_id: str, lang: str, error: str) -> None:
+    _missing.set(transcript_key(provider, video_id, lang), error)
+
+def transcript_cache_stats() -> dict:
+    return {"transcripts": _cache.stats(), "missing": _missing.stats()}
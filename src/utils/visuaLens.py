@@ -1,53 +1,203 @@
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
 import pytesseract
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration, pipeline
+from PIL import Image, ImageFilter
 from fastapi import HTTPException
 
-# Load models
-blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large", use_fast=True)
-blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+from src.utils.model_registry import model_registry
+from src.utils.visualens_backends import VISUALENS_BACKEND, load_blip, load_summarizer, runtime_of
 
-def is_text_heavy(image: Image.Image, threshold: int = 30) -> bool:
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-large"
+SUMMARIZER_MODEL_NAME = "facebook/bart-large-cnn"
+TEXT_WORD_THRESHOLD = 30  # Confident OCR words before an image is treated as a document
+OCR_MIN_CONFIDENCE = 60  # Tesseract word confidence (0-100) counted by the detector
+DETECT_MAX_DIMENSION = int(os.getenv("VISUALENS_DETECT_MAX_DIMENSION", "1200"))  # Longest side the detector looks at
+MIN_EDGE_DENSITY = 0.02  # Share of edge pixels below which an image cannot hold much text
+OCR_TILE_HEIGHT = int(os.getenv("VISUALENS_OCR_TILE_HEIGHT", "1600"))  # Target band height for tiled OCR of tall scans
+OCR_TILE_MIN_PIXELS = int(os.getenv("VISUALENS_OCR_TILE_MIN_PIXELS", str(6_000_000)))  # Smaller images are OCR'd whole
+OCR_WORKERS = int(os.getenv("VISUALENS_OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+TILE_CUT_SEARCH = 200  # Rows above and below a target cut searched for the emptiest row
+VISUALENS_BATCH_SIZE = int(os.getenv("VISUALENS_BATCH_SIZE", "8"))  # Images or texts per BLIP/BART forward pass
+
+def _load_blip():
+    # transformers is imported by the loaders, so importing visuaLens stays cheap
+    return load_blip(BLIP_MODEL_NAME, VISUALENS_BACKEND)
+
+def _load_summarizer():
+    return load_summarizer(SUMMARIZER_MODEL_NAME, VISUALENS_BACKEND)
+
+# Loaded on first use or by warmup_visualens, not at import
+model_registry.register("blip", _load_blip, runtime_of)
+model_registry.register("bart", _load_summarizer, runtime_of)
+
+def get_blip():
+    """(processor, model) for BLIP captioning."""
+    return model_registry.get("blip")
+
+def get_summarizer():
+    return model_registry.get("bart")
+
+def warmup_visualens() -> None:
+    model_registry.warmup(["blip", "bart"])
+
+def downscale(image: Image.Image, max_dimension: int = DETECT_MAX_DIMENSION) -> Image.Image:
+    if max(image.size) <= max_dimension:
+        return image
+    small = image.copy()
+    small.thumbnail((max_dimension, max_dimension), Image.BILINEAR)
+    return small
+
+def edge_density(gray: Image.Image) -> float:
+    """Share of pixels on a strong edge; text produces many short edges, photos and flat graphics few."""
+    edges = np.asarray(gray.filter(ImageFilter.FIND_EDGES))
+    return float((edges > 64).mean())
+
+def text_from_ocr_data(data: dict, min_confidence: float = 0) -> str:
+    """Rebuild line-broken text from pytesseract.image_to_data output."""
+    lines = {}
+    for i, word in enumerate(data["text"]):
+        if not word or not word.strip() or float(data["conf"][i]) < min_confidence:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word.strip())
+    return "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+
+def detect_text(image: Image.Image, threshold: int = TEXT_WORD_THRESHOLD):
+    """Cheap text-vs-visual decision on a downscaled grayscale copy.
+
+    Returns (is_text_heavy, text). ``text`` is the OCR result when the detector already looked at
+    the image at full resolution, so it does not need to be OCR'd again; otherwise None.
+    """
+    gray = downscale(image).convert("L")
+    density = edge_density(gray)
+    if density < MIN_EDGE_DENSITY:
+        print(f"Edge density {density:.3f}: treating image as visual without OCR")
+        return False, None
+
+    data = pytesseract.image_to_data(gray, output_type=pytesseract.Output.DICT)
+    confident_words = sum(
+        1 for word, conf in zip(data["text"], data["conf"])
+        if word and word.strip() and float(conf) >= OCR_MIN_CONFIDENCE
+    )
+    text_heavy = confident_words >= threshold
+    full_resolution = gray.size == image.size
+    print(f"Edge density {density:.3f}, {confident_words} confident words (full resolution: {full_resolution})")
+    return text_heavy, text_from_ocr_data(data) if text_heavy and full_resolution else None
+
+def is_text_heavy(image: Image.Image, threshold: int = TEXT_WORD_THRESHOLD) -> bool:
     """Check if the image is likely document-type using OCR word count."""
-    text = pytesseract.image_to_string(image)
-    return len(text.strip().split()) >= threshold
+    return detect_text(image, threshold)[0]
+
+def band_boundaries(gray: Image.Image, tile_height: int = OCR_TILE_HEIGHT) -> list:
+    """Row ranges for tiled OCR, cut at the emptiest row near each target so lines are not split."""
+    pixels = np.asarray(gray)
+    # Ink per row: dark pixels count, against the page's own background level
+    ink = (pixels < min(200, int(np.median(pixels)) - 40)).sum(axis=1)
+    height = pixels.shape[0]
+    bounds, top = [], 0
+    while height - top > tile_height * 1.5:
+        target = top + tile_height
+        low, high = max(top + tile_height // 2, target - TILE_CUT_SEARCH), min(height - 1, target + TILE_CUT_SEARCH)
+        cut = low + int(np.argmin(ink[low:high + 1]))
+        bounds.append((top, cut))
+        top = cut
+    bounds.append((top, height))
+    return bounds
+
+def ocr_image(image: Image.Image) -> str:
+    """Full-resolution OCR; large scans are cut into horizontal bands OCR'd in parallel."""
+    width, height = image.size
+    if width * height < OCR_TILE_MIN_PIXELS or height < OCR_TILE_HEIGHT * 2:
+        return pytesseract.image_to_string(image).strip()
+
+    gray = image.convert("L")
+    bands = [gray.crop((0, top, width, bottom)) for top, bottom in band_boundaries(gray)]
+    print(f"OCR of {width}x{height} scan in {len(bands)} bands")
+    # Tesseract runs as a subprocess per call, so threads give real parallelism
+    with ThreadPoolExecutor(max_workers=max(1, min(OCR_WORKERS, len(bands))), thread_name_prefix="ocr") as pool:
+        texts = list(pool.map(pytesseract.image_to_string, bands))
+    return "\n".join(text.strip() for text in texts if text.strip())
+
+def summarize_texts(texts: List[str]) -> List[str]:
+    """BART summaries for several texts in batched forward passes."""
+    if not texts:
+        return []
+    outputs = get_summarizer()(
+        texts, min_length=80, max_length=500, do_sample=False, truncation=True, batch_size=VISUALENS_BATCH_SIZE
+    )
+    return [output['summary_text'] for output in outputs]
+
+def caption_images(images: List[Image.Image]) -> List[str]:
+    """BLIP captions for several images, VISUALENS_BATCH_SIZE images per forward pass."""
+    blip_processor, blip_model = get_blip()
+    captions = []
+    for start in range(0, len(images), VISUALENS_BATCH_SIZE):
+        inputs = blip_processor(images=images[start:start + VISUALENS_BATCH_SIZE], return_tensors="pt")
+        out = blip_model.generate(**inputs)
+        captions.extend(blip_processor.batch_decode(out, skip_special_tokens=True))
+    return captions
+
+def _read_image(file_content: bytes):
+    """Decode one image, detect whether it is text-heavy and OCR it if so: (image, text or None)."""
+    image = Image.open(io.BytesIO(file_content)).convert("RGB")
+    text_heavy, text = detect_text(image)
+    if not text_heavy:
+        return image, None
+    # OCR at most once: reuse the detector's text when it already saw the full image
+    text = text.strip() if text else ocr_image(image)
+    if not text:
+        raise ValueError("OCR failed to detect text.")
+    return image, text
+
+def analyze_images(contents: List[bytes]) -> List[dict]:
+    """Summarize many images: OCR in a thread pool, then batched BLIP captioning and BART summaries.
+
+    Returns one result per input in the shape of extract_and_summarize_image, or
+    {"error": ...} for an image that could not be analyzed.
+    """
+    results: List[Optional[dict]] = [None] * len(contents)
+    read = [None] * len(contents)
+    # Tesseract runs as a subprocess, so OCR threads run in parallel
+    with ThreadPoolExecutor(max_workers=max(1, min(OCR_WORKERS, len(contents))), thread_name_prefix="visualens") as pool:
+        futures = [pool.submit(_read_image, content) for content in contents]
+        for i, future in enumerate(futures):
+            try:
+                read[i] = future.result()
+            except Exception as e:
+                print(f"Image {i} processing error: {e}")
+                results[i] = {"error": str(e)}
+
+    ocr_indexes = [i for i, item in enumerate(read) if item is not None and item[1] is not None]
+    visual_indexes = [i for i, item in enumerate(read) if item is not None and item[1] is None]
+    print(f"visuaLens batch: {len(ocr_indexes)} text-heavy, {len(visual_indexes)} visual, {len(contents) - len(ocr_indexes) - len(visual_indexes)} failed")
+
+    captions = caption_images([read[i][0] for i in visual_indexes]) if visual_indexes else []
+    # Only the OCR text or the caption goes to the summarizer
+    summaries = summarize_texts([read[i][1] for i in ocr_indexes] + captions)
+
+    for i, summary in zip(ocr_indexes, summaries):
+        results[i] = {"mode": "ocr", "summary": summary, "raw_text": read[i][1]}
+    for i, caption, summary in zip(visual_indexes, captions, summaries[len(ocr_indexes):]):
+        results[i] = {"mode": "vision", "caption": caption, "summary": summary}
+    return results
 
 def extract_and_summarize_image(file_content: bytes):
     """Handles both document-like and visual images and returns in-depth summaries."""
     try:
-        image = Image.open(io.BytesIO(file_content)).convert("RGB")
+        image, text = _read_image(file_content)
 
-        if is_text_heavy(image):
+        if text is not None:
             print("Text-heavy image detected. Using OCR + enriched Summarization...")
-            text = pytesseract.image_to_string(image).strip()
-            if not text:
-                raise ValueError("OCR failed to detect text.")
-
             # Only pass extracted text to the summarizer
-            summary = summarizer(text, min_length=80, max_length=500, do_sample=False)[0]['summary_text']
-
-            return {
-                "mode": "ocr",
-                "summary": summary,
-                "raw_text": text
-            }
-
-        else:
-            print("Visual image detected. Using BLIP caption + enriched summarization...")
-            inputs = blip_processor(images=image, return_tensors="pt")
-            out = blip_model.generate(**inputs)
-            caption = blip_processor.decode(out[0], skip_special_tokens=True)
-
-            # Only pass caption to the summarizer
-            summary = summarizer(caption, min_length=80, max_length=500, do_sample=False)[0]['summary_text']
-
-            return {
-                "mode": "vision",
-                "caption": caption,
-                "summary": summary
-            }
+            return {"mode": "ocr", "summary": summarize_texts([text])[0], "raw_text": text}
+
+        print("Visual image detected. Using BLIP caption + enriched summarization...")
+        caption = caption_images([image])[0]
+        # Only pass caption to the summarizer
+        return {"mode": "vision", "caption": caption, "summary": summarize_texts([caption])[0]}
 
     except Exception as e:
         print(f"Image processing error: {e}")
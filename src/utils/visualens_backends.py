@@ -0,0 +1,114 @@
+import glob
+import os
+
+# "transformers" runs the stock fp32 pipelines; "int8" runs int8-quantized models on CPU
+VISUALENS_BACKEND = os.getenv("VISUALENS_BACKEND", "transformers").lower()
+VISUALENS_NUM_THREADS = int(os.getenv("VISUALENS_NUM_THREADS", "0"))  # 0 leaves the runtime default
+VISUALENS_ONNX_DIR = os.getenv("VISUALENS_ONNX_DIR", os.path.join("data", "onnx"))
+BACKENDS = ("transformers", "int8")
+
+def configure_threads(num_threads: int = VISUALENS_NUM_THREADS) -> None:
+    if num_threads <= 0:
+        return
+    import torch
+    torch.set_num_threads(num_threads)
+
+def _check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown visuaLens backend '{backend}', expected one of {BACKENDS}")
+    return backend
+
+def _quantize_dynamic(model):
+    """int8 weights for every Linear layer, activations quantized on the fly; CPU only."""
+    import torch
+    return torch.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_blip(model_name: str, backend: str = VISUALENS_BACKEND):
+    """(processor, model) for BLIP captioning on the given backend.
+
+    ONNX Runtime exporters do not cover BLIP's vision-text generation, so the int8 backend uses
+    torch dynamic quantization for it.
+    """
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    configure_threads()
+    processor = BlipProcessor.from_pretrained(model_name, use_fast=True)
+    model = BlipForConditionalGeneration.from_pretrained(model_name)
+    if _check_backend(backend) == "int8":
+        model = _quantize_dynamic(model)
+    return processor, model
+
+def _export_quantized_onnx(model_name: str) -> str:
+    """Export the seq2seq model to ONNX and quantize each graph to int8 once; returns the directory."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    base_dir = os.path.join(VISUALENS_ONNX_DIR, model_name.replace("/", "__"))
+    export_dir = os.path.join(base_dir, "fp32")
+    quantized_dir = os.path.join(base_dir, "int8")
+    if glob.glob(os.path.join(quantized_dir, "*_quantized.onnx")):
+        return quantized_dir
+
+    print(f"Exporting {model_name} to ONNX and quantizing to int8 (one-time)...")
+    ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+    config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    for path in glob.glob(os.path.join(export_dir, "*.onnx")):
+        quantizer = ORTQuantizer.from_pretrained(export_dir, file_name=os.path.basename(path))
+        quantizer.quantize(save_dir=quantized_dir, quantization_config=config)
+    return quantized_dir
+
+def _load_onnx_seq2seq(model_name: str):
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    quantized_dir = _export_quantized_onnx(model_name)
+    files = {os.path.basename(path) for path in glob.glob(os.path.join(quantized_dir, "*_quantized.onnx"))}
+    kwargs = {}
+    for argument, stem in (
+        ("encoder_file_name", "encoder_model"),
+        ("decoder_file_name", "decoder_model"),
+        ("decoder_with_past_file_name", "decoder_with_past_model"),
+    ):
+        if f"{stem}_quantized.onnx" in files:
+            kwargs[argument] = f"{stem}_quantized.onnx"
+    if "decoder_model_merged_quantized.onnx" in files:
+        kwargs["decoder_file_name"] = "decoder_model_merged_quantized.onnx"
+
+    session_options = onnxruntime.SessionOptions()
+    if VISUALENS_NUM_THREADS > 0:
+        session_options.intra_op_num_threads = VISUALENS_NUM_THREADS
+        session_options.inter_op_num_threads = 1
+    return ORTModelForSeq2SeqLM.from_pretrained(quantized_dir, session_options=session_options, **kwargs)
+
+def load_summarizer(model_name: str, backend: str = VISUALENS_BACKEND):
+    """Summarization pipeline on the given backend.
+
+    The int8 backend runs an exported, quantized ONNX graph on ONNX Runtime. It needs
+    optimum[onnxruntime]; without it loading fails instead of quietly running something else.
+    """
+    from transformers import AutoTokenizer, pipeline
+    configure_threads()
+    if _check_backend(backend) == "transformers":
+        return pipeline("summarization", model=model_name)
+
+    try:
+        model = _load_onnx_seq2seq(model_name)
+    except ImportError as e:
+        raise RuntimeError(
+            f"VISUALENS_BACKEND=int8 needs optimum[onnxruntime] for {model_name}: {e}. "
+            "Install it or set VISUALENS_BACKEND=transformers."
+        ) from e
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return pipeline("summarization", model=model, tokenizer=tokenizer)
+
+def runtime_of(loaded) -> str:
+    """Runtime a loaded model actually runs on: onnxruntime-int8, torch-int8-dynamic or torch-fp32."""
+    model = loaded[1] if isinstance(loaded, tuple) else getattr(loaded, "model", loaded)
+    if type(model).__name__.startswith("ORTModel"):
+        return "onnxruntime-int8"
+    try:
+        from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+        if any(isinstance(module, DynamicQuantizedLinear) for module in model.modules()):
+            return "torch-int8-dynamic"
+    except Exception:
+        pass
+    return "torch-fp32"
@@ -1,7 +1,14 @@
 from dotenv import load_dotenv
 import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 from groq import Groq
-from utils.ytvideo_transcripter import extract_video_id, extract_transcript_details
+from src.utils.ytvideo_transcripter import extract_video_id, extract_transcript_details
+from src.utils.rate_limiter import rate_limiter, is_rate_limit_error
+from src.utils.tokenizer import count_tokens, split_on_tokens, truncate_to_tokens
+from src.utils.summary_cache import lookup_summaries, store_summaries
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
 
@@ -13,25 +20,17 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY not found in environment variables")
 
+SUMMARY_MODEL_NAME = "llama3-70b-8192"
+SUMMARY_TEMPERATURE = 0.5
+RESPONSE_TOKENS = 1000  # Expected summary length
+TRANSCRIPT_WINDOW_TOKENS = int(os.getenv("TRANSCRIPT_WINDOW_TOKENS", "4000"))  # Longer transcripts are summarized map-reduce
+TRANSCRIPT_MAP_CONCURRENCY = int(os.getenv("TRANSCRIPT_MAP_CONCURRENCY", "4"))  # Window summaries in flight per video
+TRANSCRIPT_MAP_RETRIES = 3  # Attempts per window
+MAP_RESPONSE_TOKENS = 500  # Expected length of one window's notes
+MAP_RETRY_BACKOFF = 1.0  # Seconds before retrying a window after a non rate limit error, doubled each time
+SUMMARY_ERROR = "Error generating summary."
 
-def generate_summary(transcript: list) -> str:
-    print(f"Transcript received: {type(transcript)} with {len(transcript) if isinstance(transcript, list) else 'N/A'} items")
-    
-    # Convert transcript list to text
-    if isinstance(transcript, list):
-        if all(isinstance(item, dict) for item in transcript):
-            transcript_text = " ".join(item.get('text', '') for item in transcript)
-        else:
-            transcript_text = " ".join(str(item) for item in transcript)
-    else:
-        transcript_text = str(transcript)
-    
-    # Truncate if too long (Groq has token limits)
-    if len(transcript_text) > 50000:
-        transcript_text = transcript_text[:50000] + "..."
-
-    # Prompt for the summary
-    summary_prompt = f"""
+SUMMARY_PROMPT_TEMPLATE = """
 You are a summarization assistant skilled at creating clear and informative summaries.
 
 Your task is to analyze the following text and produce a structured bullet-point summary that conveys the key ideas with a bit more detail.
@@ -45,31 +44,228 @@ Instructions:
 - Aim to capture the essence of the discussion, including actions, motivations, or important insights.
 
 Input:
-{transcript_text}
+{text}
 
 Summary:
 """
-    
+
+# Map step: one window of a long transcript
+MAP_PROMPT_TEMPLATE = """
+You are taking notes on one section of a longer video transcript.
+
+Write concise bullet-point notes covering everything important in this section.
+
+Instructions:
+- Keep names, numbers, definitions, examples and conclusions.
+- Paraphrase; do not copy the original wording.
+- Do not add an introductory sentence or a closing remark.
+- Do not mention that this is a section or a transcript.
+
+Section:
+{text}
+
+Notes:
+"""
+
+# Reduce step: the notes of every window, in order
+REDUCE_PROMPT_TEMPLATE = """
+You are a summarization assistant skilled at creating clear and informative summaries.
+
+The input is a set of notes taken on consecutive sections of one video, in order. Combine them into a single structured bullet-point summary of the whole video that conveys the key ideas with a bit more detail.
+
+Instructions:
+- Start each bullet with a short, descriptive title in plain text (no bold or markdown), followed by a clear, informative explanation.
+- Merge points that repeat across sections and keep the order in which ideas are developed.
+- Include relevant context and reasoning where helpful, but keep each bullet focused and concise.
+- Do not use generic phrases like "The summary is" or "In conclusion".
+- Do not include any Introductory sentence like "Here is a structured summary" or "Here is a summary".
+- Do not refer to sections or notes; write about the video itself.
+
+Input:
+{text}
+
+Summary:
+"""
+
+def transcript_to_text(transcript: list) -> str:
+    print(f"Transcript received: {type(transcript)} with {len(transcript) if isinstance(transcript, list) else 'N/A'} items")
+    if isinstance(transcript, list):
+        if all(isinstance(item, dict) for item in transcript):
+            return " ".join(item.get('text', '') for item in transcript)
+        return " ".join(str(item) for item in transcript)
+    return str(transcript)
+
+def build_summary_prompt(transcript: list) -> str:
+    """Single-pass prompt for a transcript that fits in one window."""
+    return SUMMARY_PROMPT_TEMPLATE.format(text=transcript_to_text(transcript))
+
+def get_summary_model() -> ChatGroq:
+    return ChatGroq(
+        temperature=SUMMARY_TEMPERATURE,
+        model_name=SUMMARY_MODEL_NAME,
+        api_key=GROQ_API_KEY
+    )
+
+def _content(response) -> str:
+    # Some models return an object with `.content`, some return string — handle both
+    return response.content if hasattr(response, "content") else str(response)
+
+def complete(summary_model, prompt: str, response_tokens: int = RESPONSE_TOKENS) -> str:
+    rate_limiter.reserve(SUMMARY_MODEL_NAME, count_tokens(prompt) + response_tokens)
     try:
-        summary_model = ChatGroq(
-            temperature=0.5,
-            model_name="llama3-70b-8192",
-            api_key=GROQ_API_KEY
-        )
+        return _content(summary_model.invoke(prompt))
+    except Exception as e:
+        if is_rate_limit_error(e):
+            rate_limiter.penalize(SUMMARY_MODEL_NAME)
+        raise
 
-        response = summary_model.invoke(summary_prompt)
+async def acomplete(summary_model, prompt: str, response_tokens: int = RESPONSE_TOKENS) -> str:
+    """Async variant of complete; the prompt is counted off the event loop."""
+    prompt_tokens = await asyncio.to_thread(count_tokens, prompt)
+    await rate_limiter.areserve(SUMMARY_MODEL_NAME, prompt_tokens + response_tokens)
+    try:
+        return _content(await summary_model.ainvoke(prompt))
+    except Exception as e:
+        if is_rate_limit_error(e):
+            rate_limiter.penalize(SUMMARY_MODEL_NAME)
+        raise
 
-        # Some models return an object with `.content`, some return string — handle both
-        if hasattr(response, "content"):
-            summary_text = response.content
-        else:
-            summary_text = str(response)
+def _retry_delay(error: Exception, attempt: int) -> float:
+    # After a 429 the limiter is drained, so the next reserve() does the waiting
+    return 0.0 if is_rate_limit_error(error) else MAP_RETRY_BACKOFF * 2 ** attempt
 
-        return summary_text
+def summarize_window(index: int, window: str, summary_model, retries: int = TRANSCRIPT_MAP_RETRIES) -> Optional[str]:
+    """Notes for one transcript window with up to ``retries`` attempts; None if every attempt failed."""
+    for attempt in range(retries):
+        try:
+            return complete(summary_model, MAP_PROMPT_TEMPLATE.format(text=window), MAP_RESPONSE_TOKENS)
+        except Exception as e:
+            print(f"Error summarizing transcript window {index} (attempt {attempt + 1}/{retries}): {e}")
+            if attempt < retries - 1:
+                time.sleep(_retry_delay(e, attempt))
+    return None
+
+async def asummarize_window(index: int, window: str, summary_model, retries: int = TRANSCRIPT_MAP_RETRIES) -> Optional[str]:
+    """Async variant of summarize_window."""
+    for attempt in range(retries):
+        try:
+            return await acomplete(summary_model, MAP_PROMPT_TEMPLATE.format(text=window), MAP_RESPONSE_TOKENS)
+        except Exception as e:
+            print(f"Error summarizing transcript window {index} (attempt {attempt + 1}/{retries}): {e}")
+            if attempt < retries - 1:
+                await asyncio.sleep(_retry_delay(e, attempt))
+    return None
+
+def map_windows(windows: List[str], summary_model, concurrency: int = TRANSCRIPT_MAP_CONCURRENCY) -> List[Optional[str]]:
+    """Notes for every window in order, None for windows that failed every retry.
+
+    Notes are cached per window, so after a failure the next attempt only summarizes the
+    windows that are still missing.
+    """
+    keys, notes = lookup_summaries(windows, MAP_PROMPT_TEMPLATE, SUMMARY_MODEL_NAME, SUMMARY_TEMPERATURE)
+    misses = [index for index, note in enumerate(notes) if note is None]
+    print(f"Transcript map: {len(windows) - len(misses)} of {len(windows)} windows cached")
+    if misses:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(misses))), thread_name_prefix="transcript-map") as pool:
+            results = list(pool.map(lambda index: summarize_window(index, windows[index], summary_model), misses))
+        store_summaries([keys[index] for index in misses], results)
+        for index, result in zip(misses, results):
+            notes[index] = result
+    return notes
+
+async def amap_windows(windows: List[str], summary_model, concurrency: int = TRANSCRIPT_MAP_CONCURRENCY) -> List[Optional[str]]:
+    """Async variant of map_windows, bounded by a semaphore instead of a thread pool; cache I/O runs in a thread."""
+    keys, notes = await asyncio.to_thread(lookup_summaries, windows, MAP_PROMPT_TEMPLATE, SUMMARY_MODEL_NAME, SUMMARY_TEMPERATURE)
+    misses = [index for index, note in enumerate(notes) if note is None]
+    print(f"Transcript map: {len(windows) - len(misses)} of {len(windows)} windows cached")
+    if misses:
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def summarize(index: int) -> Optional[str]:
+            async with semaphore:
+                return await asummarize_window(index, windows[index], summary_model)
+
+        results = await asyncio.gather(*(summarize(index) for index in misses))
+        await asyncio.to_thread(store_summaries, [keys[index] for index in misses], results)
+        for index, result in zip(misses, results):
+            notes[index] = result
+    return notes
+
+def transcript_windows(text: str) -> Optional[List[str]]:
+    """Token windows of ``text`` for a map round, or None when it fits in one final call."""
+    if count_tokens(text) <= TRANSCRIPT_WINDOW_TOKENS:
+        return None
+    return split_on_tokens(text, TRANSCRIPT_WINDOW_TOKENS)
+
+def _final_prompt(text: str, rounds: int) -> str:
+    if count_tokens(text) > TRANSCRIPT_WINDOW_TOKENS:
+        # Only reached when a map round stopped shrinking the notes
+        print(f"⚠️ Notes still exceed {TRANSCRIPT_WINDOW_TOKENS} tokens after {rounds} map rounds; truncating them")
+        text = truncate_to_tokens(text, TRANSCRIPT_WINDOW_TOKENS)
+    return (REDUCE_PROMPT_TEMPLATE if rounds else SUMMARY_PROMPT_TEMPLATE).format(text=text)
+
+def generate_summary(transcript: list) -> str:
+    """Summarize a transcript in one call, or map-reduce when it is longer than one window.
+
+    Windows of TRANSCRIPT_WINDOW_TOKENS are summarized concurrently into notes, and the notes
+    are mapped again, as many rounds as it takes, until they fit in one final call.
+    """
+    text = transcript_to_text(transcript)
+    try:
+        summary_model = get_summary_model()
+
+        rounds = 0
+        windows = transcript_windows(text)
+        while windows is not None:
+            notes = map_windows(windows, summary_model)
+            failed = sum(note is None for note in notes)
+            if failed:
+                print(f"⚠️ {failed} of {len(windows)} transcript windows failed; finished windows are cached for a retry")
+                return SUMMARY_ERROR
+            notes_text = "\n\n".join(notes)
+            # Stop mapping once a round no longer shrinks the notes; the final prompt then truncates them
+            shrank = len(notes_text) < len(text)
+            text = notes_text
+            rounds += 1
+            if not shrank:
+                break
+            windows = transcript_windows(text)
+
+        return complete(summary_model, _final_prompt(text, rounds))
 
     except Exception as e:
         print(f"⚠️ Error in generate_summary: {e}")
-        return "Error generating summary."
+        return SUMMARY_ERROR
+
+async def agenerate_summary(transcript: list) -> str:
+    """Async variant of generate_summary; tokenizing and splitting run in a worker thread."""
+    text = await asyncio.to_thread(transcript_to_text, transcript)
+    try:
+        summary_model = get_summary_model()
+
+        rounds = 0
+        windows = await asyncio.to_thread(transcript_windows, text)
+        while windows is not None:
+            notes = await amap_windows(windows, summary_model)
+            failed = sum(note is None for note in notes)
+            if failed:
+                print(f"⚠️ {failed} of {len(windows)} transcript windows failed; finished windows are cached for a retry")
+                return SUMMARY_ERROR
+            notes_text = "\n\n".join(notes)
+            # Stop mapping once a round no longer shrinks the notes; the final prompt then truncates them
+            shrank = len(notes_text) < len(text)
+            text = notes_text
+            rounds += 1
+            if not shrank:
+                break
+            windows = await asyncio.to_thread(transcript_windows, text)
+
+        prompt = await asyncio.to_thread(_final_prompt, text, rounds)
+        return await acomplete(summary_model, prompt)
+
+    except Exception as e:
+        print(f"⚠️ Error in agenerate_summary: {e}")
+        return SUMMARY_ERROR
 
 
 def process_video(youtube_link: str) -> dict:
@@ -94,3 +290,26 @@ def process_video(youtube_link: str) -> dict:
     
     except Exception as e:
         return {"error": f"Unexpected error: {str(e)}"}
+
+
+async def aprocess_video(youtube_link: str) -> dict:
+    """Async variant of process_video; the transcript fetch runs in a worker thread."""
+    if not youtube_link:
+        return {"error": "Enter a YouTube URL."}
+
+    try:
+        video_id = extract_video_id(youtube_link)
+        if not video_id:
+            return {"error": "Invalid YouTube URL."}
+
+        thumbnail = f"http://img.youtube.com/vi/{video_id}/0.jpg"
+        transcript, err = await asyncio.to_thread(extract_transcript_details, youtube_link)
+
+        if err or not transcript:
+            return {"error": err or "No transcript extracted.", "thumbnail": thumbnail}
+
+        summary = await agenerate_summary(transcript)
+        return {"summary": summary, "thumbnail": thumbnail, "video_id": video_id}
+
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
@@ -1,18 +1,39 @@
 import re
 import os
+import json
+import threading
 from typing import List, Tuple, Optional, Union
 from dotenv import load_dotenv
-from supadata import Supadata
+from src.utils.transcript_cache import get_cached_transcript, cache_transcript, cache_missing_transcript
 
 # Load environment variables
 load_dotenv()
 
 SUPADATA_API_KEY = os.getenv("SUPADATA_API_KEY")
-if not SUPADATA_API_KEY:
-    raise ValueError("SUPADATA_API_KEY not found in environment variables")
-
-# Initialize Supadata
-supadata = Supadata(api_key=SUPADATA_API_KEY)
+TRANSCRIPT_PROVIDER = os.getenv("TRANSCRIPT_PROVIDER", "supadata").lower()  # "supadata" or "local"
+TRANSCRIPT_LOCAL_DIR = os.getenv("TRANSCRIPT_LOCAL_DIR", os.path.join("data", "transcripts"))
+TRANSCRIPT_LANGUAGE = "en"
+
+# Exact answers meaning the video has no transcript; everything else (quota, auth, network) is not cached
+TRANSCRIPT_NOT_FOUND_ERROR = "Error: Video not found or transcript not available."
+TRANSCRIPT_LANGUAGE_ERROR = "Error: English transcript not available for this video."
+PERMANENT_TRANSCRIPT_ERRORS = frozenset({TRANSCRIPT_NOT_FOUND_ERROR, TRANSCRIPT_LANGUAGE_ERROR})
+AUTH_ERROR_MARKERS = ("401", "403", "unauthorized", "forbidden", "api key", "invalid key")
+
+_supadata = None
+_supadata_lock = threading.Lock()
+_fetch_locks = [threading.Lock() for _ in range(64)]  # Striped by video so memory stays bounded
+
+def get_supadata():
+    """Supadata client, created on first use so the local provider runs without a key."""
+    global _supadata
+    with _supadata_lock:
+        if _supadata is None:
+            if not SUPADATA_API_KEY:
+                raise ValueError("SUPADATA_API_KEY not found in environment variables")
+            from supadata import Supadata
+            _supadata = Supadata(api_key=SUPADATA_API_KEY)
+        return _supadata
 
 
 def extract_video_id(youtube_url: str) -> Optional[str]:
@@ -94,24 +115,20 @@ def extract_text_segments(transcript: Union[dict, list, object]) -> List[str]:
         return [str(transcript)]
 
 
-def extract_transcript_details(youtube_url: str) -> Tuple[Optional[List[str]], Optional[str]]:
-    """Main function to extract transcript segments from a YouTube URL."""
+def fetch_supadata_transcript(video_id: str, lang: str = TRANSCRIPT_LANGUAGE) -> Tuple[Optional[List[str]], Optional[str]]:
+    supadata = get_supadata()
     try:
-        video_id = extract_video_id(youtube_url)
-        if not video_id:
-            return None, "Error: Invalid YouTube URL."
-
         try:
-            transcript_response = supadata.youtube.transcript(video_id, lang='en')
+            transcript_response = supadata.youtube.transcript(video_id, lang=lang)
         except Exception as lang_error:
             print(f"English transcript not available, trying auto-detection: {lang_error}")
             transcript_response = supadata.youtube.transcript(video_id)
 
-            if hasattr(transcript_response, 'lang') and transcript_response.lang != 'en':
+            if hasattr(transcript_response, 'lang') and transcript_response.lang != lang:
                 print(f"Warning: Transcript is in {transcript_response.lang}, not English")
-                if hasattr(transcript_response, 'available_langs') and 'en' in transcript_response.available_langs:
+                if hasattr(transcript_response, 'available_langs') and lang in transcript_response.available_langs:
                     try:
-                        transcript_response = supadata.youtube.transcript(video_id, lang='en')
+                        transcript_response = supadata.youtube.transcript(video_id, lang=lang)
                         print(f"Successfully retrieved English transcript")
                     except:
                         return None, f"Error: English transcript is listed as available but could not be retrieved. Available languages: {transcript_response.available_langs}"
@@ -125,15 +142,84 @@ def extract_transcript_details(youtube_url: str) -> Tuple[Optional[List[str]], O
 
     except Exception as e:
         error_msg = str(e)
-        print(f"Exception in extract_transcript_details: {error_msg}")
+        print(f"Exception in fetch_supadata_transcript: {error_msg}")
 
         if "not found" in error_msg.lower() or "404" in error_msg:
-            return None, "Error: Video not found or transcript not available."
-        elif "private" in error_msg.lower() or "403" in error_msg:
+            return None, TRANSCRIPT_NOT_FOUND_ERROR
+        elif "private" in error_msg.lower():
             return None, "Error: Video is private or restricted."
+        elif any(marker in error_msg.lower() for marker in AUTH_ERROR_MARKERS):
+            # A revoked or invalid key also answers 403; that says nothing about the video
+            return None, "Error: Transcript service rejected the request. Please try again later."
         elif "quota" in error_msg.lower() or "rate limit" in error_msg.lower():
             return None, "Error: API quota exceeded. Please try again later."
         elif "language" in error_msg.lower():
-            return None, "Error: English transcript not available for this video."
+            return None, TRANSCRIPT_LANGUAGE_ERROR
         else:
             return None, f"Error: Unexpected issue – {error_msg}"
+
+
+def fetch_local_transcript(video_id: str, lang: str = TRANSCRIPT_LANGUAGE) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Stand-in provider reading TRANSCRIPT_LOCAL_DIR/<video_id>[.<lang>].json or .txt.
+
+    A .json file holds anything extract_text_segments understands, e.g. a list of segments;
+    a .txt file holds one segment per line.
+    """
+    for name in (f"{video_id}.{lang}", video_id):
+        base = os.path.join(TRANSCRIPT_LOCAL_DIR, name)
+        if os.path.exists(base + ".json"):
+            with open(base + ".json", encoding="utf-8") as f:
+                text_segments = extract_text_segments(json.load(f))
+        elif os.path.exists(base + ".txt"):
+            with open(base + ".txt", encoding="utf-8") as f:
+                text_segments = [line.strip() for line in f if line.strip()]
+        else:
+            continue
+        if not text_segments:
+            return None, "Error: No transcript content found."
+        return text_segments, None
+    return None, TRANSCRIPT_NOT_FOUND_ERROR
+
+
+TRANSCRIPT_PROVIDERS = {
+    "supadata": fetch_supadata_transcript,
+    "local": fetch_local_transcript,
+}
+
+
+def _fetch_lock(key: tuple) -> threading.Lock:
+    return _fetch_locks[hash(key) % len(_fetch_locks)]
+
+
+def extract_transcript_details(youtube_url: str) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Main function to extract transcript segments from a YouTube URL.
+
+    Transcripts and "no transcript" answers are cached per video and language, so a video that
+    was summarized before costs no provider call. Concurrent requests for the same video wait
+    for a single fetch.
+    """
+    try:
+        video_id = extract_video_id(youtube_url)
+        if not video_id:
+            return None, "Error: Invalid YouTube URL."
+
+        provider, lang = TRANSCRIPT_PROVIDER, TRANSCRIPT_LANGUAGE
+        if provider not in TRANSCRIPT_PROVIDERS:
+            return None, f"Error: Unknown transcript provider '{provider}'."
+
+        with _fetch_lock((provider, video_id, lang)):
+            cached = get_cached_transcript(provider, video_id, lang)
+            if cached is not None:
+                print(f"Reusing cached transcript for {video_id}")
+                return cached
+
+            text_segments, err = TRANSCRIPT_PROVIDERS[provider](video_id, lang)
+            if text_segments:
+                cache_transcript(provider, video_id, lang, text_segments)
+            elif err in PERMANENT_TRANSCRIPT_ERRORS:
+                cache_missing_transcript(provider, video_id, lang, err)
+            return text_segments, err
+
+    except Exception as e:
+        print(f"Exception in extract_transcript_details: {e}")
+        return None, f"Error: Unexpected issue – {str(e)}"
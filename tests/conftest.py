@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# src.serve reads these at import time; keep every on-disk cache out of the working tree
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_data_dir = tempfile.mkdtemp(prefix="synthia-tests-")
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+os.environ.setdefault("SESSION_PERSIST_DIR", "")
+for name in ("INGEST_CACHE_DIR", "SUMMARY_CACHE_DIR", "TRANSCRIPT_CACHE_DIR"):
+    os.environ.setdefault(name, os.path.join(_data_dir, name.lower()))
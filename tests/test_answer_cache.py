@@ -0,0 +1,39 @@
+from src.utils.answer_cache import AnswerCache
+
+QUESTION = [1.0, 0.0, 0.0]
+NEAR_DUPLICATE = [0.99, 0.05, 0.0]
+UNRELATED = [0.0, 1.0, 0.0]
+RESULT = {"answer": "cached", "sources": ["s"], "total_sources": 1}
+
+def test_near_duplicate_question_hits():
+    cache = AnswerCache(similarity=0.95)
+    cache.store("session", "question", QUESTION, 5, RESULT)
+    assert cache.lookup("session", NEAR_DUPLICATE, 5) == RESULT
+    assert cache.lookup("session", UNRELATED, 5) is None
+    assert cache.lookup("other-session", QUESTION, 5) is None
+
+def test_k_and_generation_must_match():
+    cache = AnswerCache(similarity=0.95)
+    cache.store("video", "question", QUESTION, 5, RESULT, generation="session_video_aaaa_idx")
+    assert cache.lookup("video", QUESTION, 3, "session_video_aaaa_idx") is None
+    # Another worker rebuilt the index: answers about the old one are not served
+    assert cache.lookup("video", QUESTION, 5, "session_video_bbbb_idx") is None
+    assert cache.lookup("video", QUESTION, 5, "session_video_aaaa_idx") == RESULT
+
+def test_expired_and_invalidated_answers_are_dropped():
+    cache = AnswerCache(similarity=0.95, ttl_seconds=0)
+    cache.store("session", "question", QUESTION, 5, RESULT)
+    assert cache.lookup("session", QUESTION, 5) is None
+
+    cache = AnswerCache(similarity=0.95)
+    cache.store("session", "question", QUESTION, 5, RESULT)
+    cache.invalidate("session")
+    assert cache.lookup("session", QUESTION, 5) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_per_session_bound_drops_oldest_answers():
+    cache = AnswerCache(similarity=0.95, max_per_session=1)
+    cache.store("session", "first", QUESTION, 5, RESULT)
+    cache.store("session", "second", UNRELATED, 5, {**RESULT, "answer": "second"})
+    assert cache.lookup("session", QUESTION, 5) is None
+    assert cache.lookup("session", UNRELATED, 5)["answer"] == "second"
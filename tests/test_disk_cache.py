@@ -0,0 +1,61 @@
+import os
+import time
+
+from src.utils.disk_cache import DiskCache
+
+def backdate(cache: DiskCache, key: str, seconds: float) -> None:
+    path = cache._path(key)
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+def test_roundtrip_and_miss(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1_000_000)
+    cache.set("k", {"value": [1, 2, 3]})
+    assert cache.get("k") == {"value": [1, 2, 3]}
+    assert cache.get("missing", "default") == "default"
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+def test_ttl_counts_from_the_write_not_the_last_read(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1_000_000, ttl_seconds=100)
+    cache.set("k", "value")
+    backdate(cache, "k", 60)
+    written = os.path.getmtime(cache._path("k"))
+
+    # Reading must not extend the entry's life
+    assert cache.get("k") == "value"
+    assert os.path.getmtime(cache._path("k")) == written
+
+    backdate(cache, "k", 101)
+    assert cache.get("k") is None
+    assert not os.path.exists(cache._path("k"))
+
+def test_reads_refresh_entries_without_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1_000_000)
+    cache.set("k", "value")
+    backdate(cache, "k", 3600)
+    assert cache.get("k") == "value"
+    assert time.time() - os.path.getmtime(cache._path("k")) < 60
+
+def test_size_bound_evicts_least_recently_read(tmp_path):
+    payload = b"x" * 400
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.set("a", payload)
+    cache.set("b", payload)
+    backdate(cache, "a", 30)
+    backdate(cache, "b", 20)
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") == payload
+
+    cache.set("c", payload)
+    assert cache.get("b") is None
+    assert cache.get("a") == payload
+    assert cache.get("c") == payload
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 1000
+
+def test_values_larger_than_the_cache_are_not_stored(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=100)
+    cache.set("big", b"x" * 1000)
+    assert cache.get("big") is None
@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.vectorstores import InMemoryVectorStore
+
+import src.serve as serve
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+def make_client(monkeypatch):
+    embedding = DeterministicFakeEmbedding(size=16)
+    vectorstore = InMemoryVectorStore(embedding)
+    vectorstore.add_documents([
+        Document(page_content="The talk explains how rate limits are enforced."),
+        Document(page_content="Caching repeated questions saves model calls."),
+    ])
+    # Same shape as a sumTube session: a plain retriever from as_retriever()
+    serve.session_store.put(VIDEO_ID, vectorstore.as_retriever(search_kwargs={"k": 5}), nbytes=0, persisted=False)
+    serve.answer_cache.invalidate(VIDEO_ID)
+
+    async def fake_answer(question, docs):
+        return {
+            "answer": f"{len(docs)} sources",
+            "sources": [{"content": doc.page_content} for doc in docs],
+            "total_sources": len(docs),
+        }
+
+    monkeypatch.setattr(serve, "get_embedding_model", lambda: embedding)
+    monkeypatch.setattr(serve, "aanswer_question_legacy", fake_answer)
+    serve.app.dependency_overrides[serve.verify_token] = lambda: {"user_id": "tester"}
+    return TestClient(serve.app)
+
+def test_query_plain_vectorstore_session(monkeypatch):
+    client = make_client(monkeypatch)
+    try:
+        response = client.post("/query", data={"video_id": VIDEO_ID, "question": "How are rate limits enforced?", "k": 2})
+    finally:
+        serve.app.dependency_overrides.clear()
+        serve.session_store.remove(VIDEO_ID)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is True
+    assert body["total_sources"] == 2
+    assert len(body["sources"]) == 2
+
+def test_search_by_vector_uses_wrapped_vectorstore(monkeypatch):
+    client = make_client(monkeypatch)
+    try:
+        retriever = serve.session_store.get(VIDEO_ID)
+        vector = serve.get_embedding_model().embed_query("caching")
+        docs = serve.search_by_vector(retriever, vector, 1)
+    finally:
+        client.close()
+        serve.app.dependency_overrides.clear()
+        serve.session_store.remove(VIDEO_ID)
+
+    assert len(docs) == 1
+    assert isinstance(docs[0], Document)
@@ -0,0 +1,77 @@
+import pytest
+
+import src.utils.rate_limiter as rate_limiter_module
+from src.utils.rate_limiter import GroqRateLimiter, _refill, _take
+
+LIMITS = {"rpm": 30, "tpm": 6000}
+MODEL = "test-model"
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter_module.time, "time", clock)
+    return clock
+
+def full_state(now: float = 0.0) -> dict:
+    return {"requests": LIMITS["rpm"], "tokens": LIMITS["tpm"], "updated": now}
+
+def test_take_deducts_when_both_buckets_have_room():
+    state, wait = _take(full_state(), LIMITS, requests=1, tokens=1000, now=0.0)
+    assert wait == 0
+    assert state["requests"] == LIMITS["rpm"] - 1
+    assert state["tokens"] == LIMITS["tpm"] - 1000
+
+def test_take_waits_for_the_token_deficit_without_deducting():
+    state = {"requests": 5, "tokens": 500, "updated": 0.0}
+    state, wait = _take(state, LIMITS, requests=1, tokens=1100, now=0.0)
+    # 600 missing tokens refill at 100 per second
+    assert wait == pytest.approx(6.0)
+    assert state["tokens"] == 500
+    assert state["requests"] == 5
+
+def test_take_caps_a_reservation_at_a_full_bucket():
+    _, wait = _take(full_state(), LIMITS, requests=1, tokens=10 * LIMITS["tpm"], now=0.0)
+    assert wait == 0
+
+def test_refill_is_linear_and_capped():
+    state = _refill({"requests": 0, "tokens": 0, "updated": 0.0}, LIMITS, now=30.0)
+    assert state["requests"] == pytest.approx(15)
+    assert state["tokens"] == pytest.approx(3000)
+    state = _refill(state, LIMITS, now=1000.0)
+    assert state == {"requests": LIMITS["rpm"], "tokens": LIMITS["tpm"], "updated": 1000.0}
+
+def test_penalize_drains_the_budget_for_every_caller(clock):
+    limiter = GroqRateLimiter(state_dir="")
+    assert limiter._try_reserve(MODEL, 100, 1) == 0
+    limiter.penalize(MODEL)
+    assert limiter._try_reserve(MODEL, 100, 1) > 0
+    assert limiter.utilisation()[MODEL]["rate_limited"] == 1
+    # A full minute refills both buckets
+    clock.now += 60
+    assert limiter._try_reserve(MODEL, 100, 1) == 0
+
+def test_settle_returns_unused_tokens_and_charges_overruns(clock):
+    limiter = GroqRateLimiter(state_dir="")
+    assert limiter._try_reserve(MODEL, 4000, 1) == 0
+    limiter.settle(MODEL, reserved_tokens=4000, actual_tokens=1000)
+    assert limiter.utilisation()[MODEL]["tokens_available"] == pytest.approx(5000)
+
+    limiter.settle(MODEL, reserved_tokens=1000, actual_tokens=3000)
+    assert limiter.utilisation()[MODEL]["tokens_available"] == pytest.approx(3000)
+
+    # Returned tokens never overflow the bucket
+    limiter.settle(MODEL, reserved_tokens=100000, actual_tokens=0)
+    assert limiter.utilisation()[MODEL]["tokens_available"] == LIMITS["tpm"]
+
+def test_state_dir_shares_the_budget_between_limiters(clock, tmp_path):
+    first = GroqRateLimiter(state_dir=str(tmp_path))
+    second = GroqRateLimiter(state_dir=str(tmp_path))
+    assert first._try_reserve(MODEL, LIMITS["tpm"], 1) == 0
+    assert second._try_reserve(MODEL, 1000, 1) > 0
@@ -0,0 +1,113 @@
+import pytest
+
+import src.utils.session_store as session_store_module
+from src.utils.session_store import SessionStore
+
+class FakeVectorStore:
+    def __init__(self):
+        self.deleted = False
+
+    def delete_collection(self):
+        self.deleted = True
+
+class FakeRetriever:
+    def __init__(self):
+        self.vectorstore = FakeVectorStore()
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(session_store_module.time, "monotonic", clock)
+    return clock
+
+def make_store(**kwargs) -> SessionStore:
+    kwargs.setdefault("max_entries", 10)
+    kwargs.setdefault("max_bytes", 10_000)
+    kwargs.setdefault("ttl_seconds", 3600)
+    return SessionStore(**kwargs)
+
+def put(store: SessionStore, key: str, nbytes: int = 10, persisted: bool = False) -> FakeRetriever:
+    retriever = FakeRetriever()
+    store.put(key, retriever, nbytes=nbytes, persisted=persisted)
+    return retriever
+
+def test_evicts_least_recently_used_entry(clock):
+    store = make_store(max_entries=2)
+    a = put(store, "a")
+    b = put(store, "b")
+    assert store.get("a") is a
+    put(store, "c")
+
+    assert store.get("b") is None
+    assert store.get("a") is a
+    assert store.is_expired("b")
+    assert not store.is_expired("a")
+    assert not store.is_expired("never-seen")
+    # The evicted in-memory session's collection is deleted
+    assert b.vectorstore.deleted
+    assert store.stats()["evictions"]["entries"] == 1
+
+def test_byte_budget_evicts_oldest_and_keeps_accounting(clock):
+    store = make_store(max_bytes=100)
+    put(store, "a", nbytes=60)
+    put(store, "b", nbytes=30)
+    put(store, "c", nbytes=30)
+
+    stats = store.stats()
+    assert stats["bytes"] == 60
+    assert stats["entries"] == 2
+    assert stats["evictions"]["bytes"] == 1
+    assert store.is_expired("a")
+
+def test_newest_entry_is_kept_even_when_over_budget(clock):
+    store = make_store(max_bytes=100)
+    big = put(store, "big", nbytes=500)
+    assert store.get("big") is big
+    assert store.stats()["bytes"] == 500
+
+def test_idle_entries_expire_after_ttl(clock):
+    store = make_store(ttl_seconds=60)
+    put(store, "idle")
+    active = put(store, "active")
+
+    clock.now += 40
+    assert store.get("active") is active
+    clock.now += 30
+
+    assert store.get("idle") is None
+    assert store.is_expired("idle")
+    assert store.get("active") is active
+    assert store.stats()["evictions"]["ttl"] == 1
+
+def test_replacing_a_key_updates_bytes_and_releases_the_old_retriever(clock):
+    store = make_store()
+    old = put(store, "a", nbytes=40)
+    new = put(store, "a", nbytes=25)
+
+    assert store.get("a") is new
+    assert old.vectorstore.deleted
+    assert store.stats()["bytes"] == 25
+    assert store.stats()["evictions"]["replaced"] == 1
+
+def test_remove_frees_bytes(clock):
+    store = make_store()
+    retriever = put(store, "a", nbytes=40)
+    store.remove("a")
+    assert store.stats()["bytes"] == 0
+    assert retriever.vectorstore.deleted
+    # Removed on purpose, not evicted
+    assert not store.is_expired("a")
+
+def test_persisted_sessions_keep_their_collection_on_eviction(clock):
+    store = make_store(max_entries=1)
+    persisted = put(store, "a", persisted=True)
+    put(store, "b")
+    assert store.is_expired("a")
+    assert not persisted.vectorstore.deleted
@@ -0,0 +1,36 @@
+from src.utils.tokenizer import ENCODER, count_tokens, split_on_tokens, truncate_to_tokens
+
+PROSE = " ".join(f"Sentence {i} talks about rate limits, caching and retrieval." for i in range(200))
+
+def test_split_respects_token_budget():
+    pieces = split_on_tokens(PROSE, 50)
+    assert len(pieces) > 1
+    assert all(len(ENCODER.encode(piece)) <= 50 for piece in pieces)
+
+def test_split_cuts_between_words():
+    pieces = split_on_tokens(PROSE, 37)
+    # No word is cut in half: the pieces hold exactly the words of the text, in order
+    assert " ".join(pieces).split() == PROSE.split()
+
+def test_split_keeps_short_text_whole():
+    assert split_on_tokens("  short text  ", 50) == ["short text"]
+    assert split_on_tokens("   ", 50) == []
+
+def test_split_never_breaks_multibyte_characters():
+    text = "日本語のテキストを分割します。" * 100 + "🙂" * 50
+    pieces = split_on_tokens(text, 7)
+    assert len(pieces) > 1
+    # Text without spaces is cut between characters; a split character would lose its bytes
+    assert "".join(pieces) == text
+
+def test_truncate_returns_word_aligned_prefix():
+    truncated = truncate_to_tokens(PROSE, 20)
+    assert PROSE.startswith(truncated)
+    assert len(ENCODER.encode(truncated)) <= 20
+    assert PROSE[len(truncated)] == " "
+    assert truncate_to_tokens("", 20) == ""
+
+def test_count_tokens_matches_encoder_when_memoized():
+    assert count_tokens(PROSE) == len(ENCODER.encode(PROSE))
+    # Second call is answered from the memo and must agree
+    assert count_tokens(PROSE) == len(ENCODER.encode(PROSE))